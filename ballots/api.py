@@ -0,0 +1,160 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+
+from ballots.counters import votes_cast
+from ballots.models import Ballot, Choice, Question
+from ballots.storage import choice_counts
+from ballots.voting import can_vote, cast_vote, clean_submission_key, eligible_ballots, selected_choices, \
+    was_submitted
+
+# Version 1 of the JSON API used by mobile and kiosk clients, mounted at /api/v1/. It signs in with the
+# same session as the site, so votes need the csrftoken cookie, set by the ballot definition, sent back in
+# the X-CSRFToken header. Payloads are compact JSON, GET responses carry an ETag of their body and are
+# answered 304 Not Modified when the client already has it.
+
+BALLOT_FIELDS = ('id', 'ballot_title', 'ballot_description', 'pub_date', 'due_date', 'district', 'state')
+
+
+def json_response(request, payload, status=200):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    response = HttpResponse(body, status=status, content_type='application/json')
+    if request.method != 'GET':
+        return response
+    etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+    response['ETag'] = etag
+    # clients may keep the response but must check it is still current before using it
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def error(status, message):
+    return HttpResponse(json.dumps({'error': message}), status=status, content_type='application/json')
+
+
+def api_login_required(view):
+    """
+    answers 401 instead of redirecting to the login page
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error(401, 'Authentication required')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def get_ballot(ballot_id):
+    return Ballot.objects.only(*BALLOT_FIELDS).filter(pk=ballot_id).first()
+
+
+def ballot_questions(ballot, with_votes=False):
+    """
+    [{id, text, choices: [{id, text}]}] in two queries, choices carry their frozen votes when with_votes
+    """
+    fields = ('question_id', 'id', 'choice_text') + (('votes',) if with_votes else ())
+    choices = {}
+    for row in Choice.objects.filter(question__ballot=ballot).order_by('id').values_list(*fields):
+        choice = {'id': row[1], 'text': row[2]}
+        if with_votes:
+            choice['votes'] = row[3]
+        choices.setdefault(row[0], []).append(choice)
+    return [{'id': question_id, 'text': text, 'choices': choices.get(question_id, [])}
+            for question_id, text in Question.objects.filter(ballot=ballot).order_by('id')
+            .values_list('id', 'question_text')]
+
+
+@require_GET
+@api_login_required
+def ballot_list(request):
+    """
+    the ballots the voter can vote on now
+    """
+    ballots = eligible_ballots(request.voter).values_list('id', 'ballot_title', 'due_date')
+    return json_response(request, {'ballots': [{'id': ballot_id, 'title': title, 'due': due_date}
+                                               for ballot_id, title, due_date in ballots]})
+
+
+@require_GET
+@api_login_required
+@ensure_csrf_cookie
+def ballot_definition(request, ballot_id):
+    """
+    the questions and choices of an open ballot of the voter's district
+    """
+    ballot = get_ballot(ballot_id)
+    if ballot is None:
+        return error(404, 'Ballot does not exist')
+    if not can_vote(ballot, request.voter):
+        return error(403, 'Ballot is not open to this voter')
+    return json_response(request, {
+        'id': ballot.pk,
+        'title': ballot.ballot_title,
+        'description': ballot.ballot_description,
+        'due': ballot.due_date,
+        'questions': ballot_questions(ballot),
+    })
+
+
+@require_POST
+@api_login_required
+def ballot_vote(request, ballot_id):
+    """
+    takes {"choices": {"<question id>": <choice id>}, "submission_key": "<client generated key>"}, the optional
+    submission key makes retrying the request safe
+    """
+    try:
+        data = json.loads(request.body)
+        picked = {int(question_id): int(choice_id) for question_id, choice_id in data['choices'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return error(400, 'Expected {"choices": {"<question id>": <choice id>}}')
+    sign = request.voter.signature
+    submission_key = clean_submission_key(data.get('submission_key', ''))
+    if was_submitted(sign, submission_key):
+        return json_response(request, {'ballot': ballot_id, 'recorded': True})
+    ballot = get_ballot(ballot_id)
+    if ballot is None:
+        return error(404, 'Ballot does not exist')
+    if not can_vote(ballot, request.voter):
+        return error(403, 'Ballot is not open to this voter')
+    selected = selected_choices(ballot, picked)
+    if not selected:
+        return error(400, 'Invalid choices')
+    # a voter who already voted fails on the VoteRecord constraint, no lookup is needed before
+    if not cast_vote(ballot, sign, selected, submission_key):
+        return error(409, 'Already voted')
+    return json_response(request, {'ballot': ballot.pk, 'recorded': True}, status=201)
+
+
+@require_GET
+def ballot_results(request, ballot_id):
+    """
+    the votes of every choice once the ballot has closed, like the results page open to anyone
+    """
+    ballot = get_ballot(ballot_id)
+    if ballot is None:
+        return error(404, 'Ballot does not exist')
+    if ballot.due_date > timezone.now():
+        return error(403, 'Ballot is still open')
+    # tallied and archived ballots have their counts frozen on the choices
+    frozen = ballot.state in (Ballot.TALLIED, Ballot.ARCHIVED)
+    questions = ballot_questions(ballot, with_votes=frozen)
+    if not frozen:
+        counts = choice_counts(ballot)
+        for question in questions:
+            for choice in question['choices']:
+                choice['votes'] = counts.get(choice['id'], 0)
+    return json_response(request, {
+        'id': ballot.pk,
+        'title': ballot.ballot_title,
+        'votes_cast': votes_cast(ballot),
+        'questions': questions,
+    })
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import api
+
+app_name = 'api-v1'
+urlpatterns = [
+    path('ballots/', api.ballot_list, name='ballots'),
+    path('ballots/<int:ballot_id>/', api.ballot_definition, name='ballot'),
+    path('ballots/<int:ballot_id>/vote/', api.ballot_vote, name='vote'),
+    path('ballots/<int:ballot_id>/results/', api.ballot_results, name='results'),
+]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BallotsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ballots'
+
+    def ready(self):
+        from . import counters
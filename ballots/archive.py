@@ -0,0 +1,89 @@
+import datetime
+import hashlib
+import json
+import zlib
+
+from django.db import transaction
+from django.utils import timezone
+
+from ballots.models import Ballot, Choice, BallotArchive
+from ballots.storage import iter_cast_ballots, choice_counts, delete_cast_ballots
+
+# Ballots whose due date is older than this are considered archived
+ARCHIVE_HORIZON = datetime.timedelta(days=365.24)
+
+
+class ArchiveChecksumError(Exception):
+    pass
+
+
+def archive_cutoff(now=None):
+    if now is None:
+        now = timezone.now()
+    return now - ARCHIVE_HORIZON
+
+
+def archivable_ballots(now=None):
+    """
+    ballots past the archive horizon whose raw votes are still in the hot tables
+    """
+    return Ballot.objects.filter(due_date__lte=archive_cutoff(now), archive__isnull=True).order_by('due_date')
+
+
+def archive_ballot(ballot):
+    """
+    rolls the cast ballots of a closed ballot into a compressed, checksummed BallotArchive with the final tallies,
+    then deletes the raw cast ballot rows
+    """
+    with transaction.atomic():
+        compressor = zlib.compressobj(9)
+        chunks = []
+        cast_count = 0
+        for cast_id, choice_ids in iter_cast_ballots(ballot):
+            line = json.dumps([cast_id, choice_ids], separators=(',', ':')) + '\n'
+            chunks.append(compressor.compress(line.encode()))
+            cast_count += 1
+        chunks.append(compressor.flush())
+        payload = b''.join(chunks)
+
+        counts = choice_counts(ballot)
+        choices = list(Choice.objects.filter(question__ballot=ballot))
+        for choice in choices:
+            choice.votes = counts.get(choice.id, 0)
+        Choice.objects.bulk_update(choices, ['votes'])
+
+        archive = BallotArchive.objects.create(
+            ballot=ballot,
+            cast_ballot_count=cast_count,
+            tallies={str(choice.id): choice.votes for choice in choices},
+            payload=payload,
+            checksum=hashlib.sha256(payload).hexdigest(),
+        )
+
+        delete_cast_ballots(ballot)
+        Ballot.objects.filter(pk=ballot.pk).update(state=Ballot.ARCHIVED)
+        ballot.state = Ballot.ARCHIVED
+    return archive
+
+
+def iter_archived_cast_ballots(archive, verify=True):
+    """
+    streams the (cast ballot id, [choice ids]) rows back out of an archive for auditing,
+    packed format cast ballots have negative ids
+    """
+    payload = bytes(archive.payload)
+    if verify and hashlib.sha256(payload).hexdigest() != archive.checksum:
+        raise ArchiveChecksumError('Archive for ballot %s failed checksum verification' % archive.ballot_id)
+    decompressor = zlib.decompressobj()
+    pending = b''
+    for start in range(0, len(payload), 64 * 1024):
+        pending += decompressor.decompress(payload[start:start + 64 * 1024])
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            cast_id, choice_ids = json.loads(line)
+            yield cast_id, choice_ids
+    pending += decompressor.flush()
+    for line in pending.split(b'\n'):
+        if line:
+            cast_id, choice_ids = json.loads(line)
+            yield cast_id, choice_ids
@@ -0,0 +1,116 @@
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from ballots.models import Ballot, BallotTurnout, DistrictRoll
+from users.models import Profile
+
+# Turnout counters are kept up to date as votes are cast and profiles change,
+# so admin pages read them without scanning VoteRecord or Profile.
+
+# Votes on a ballot increment one of its turnout rows at random. The row stays locked until the
+# vote's transaction commits, with a single row every vote on a ballot would wait for the previous one.
+TURNOUT_SHARDS = 8
+
+
+def district_key(district):
+    return (district or '').lower()
+
+
+def record_vote(ballot):
+    """
+    counts one more vote cast on a ballot, call inside the transaction that creates the VoteRecord
+    """
+    shard = BallotTurnout.objects.filter(ballot=ballot, shard=random.randrange(TURNOUT_SHARDS))
+    if shard.update(votes_cast=F('votes_cast') + 1):
+        return
+    # the ballot's first vote creates all of its shards, a concurrent first vote may have created them already
+    BallotTurnout.objects.bulk_create([BallotTurnout(ballot=ballot, shard=number) for number in range(TURNOUT_SHARDS)],
+                                      ignore_conflicts=True)
+    shard.update(votes_cast=F('votes_cast') + 1)
+
+
+def adjust_district(district, delta):
+    key = district_key(district)
+    if not key or not delta:
+        return
+    if DistrictRoll.objects.filter(district=key).update(eligible_voters=F('eligible_voters') + delta):
+        return
+    roll, created = DistrictRoll.objects.get_or_create(district=key, defaults={'eligible_voters': max(delta, 0)})
+    if not created:
+        DistrictRoll.objects.filter(pk=roll.pk).update(eligible_voters=F('eligible_voters') + delta)
+
+
+def votes_cast(ballot):
+    return BallotTurnout.objects.filter(ballot=ballot).aggregate(total=Sum('votes_cast'))['total'] or 0
+
+
+def eligible_voters(district):
+    return DistrictRoll.objects.filter(district=district_key(district))\
+        .values_list('eligible_voters', flat=True).first() or 0
+
+
+def with_turnout(queryset):
+    """
+    annotates ballots with votes_cast and eligible_voters read from the counters
+    """
+    return queryset.annotate(
+        votes_cast=Coalesce(Subquery(BallotTurnout.objects.filter(ballot=OuterRef('pk')).order_by().values('ballot')
+                                     .annotate(total=Sum('votes_cast')).values('total')),
+                            Value(0), output_field=IntegerField()),
+        eligible_voters=Coalesce(Subquery(DistrictRoll.objects.filter(district=Lower(OuterRef('district')))
+                                          .values('eligible_voters')[:1]), Value(0), output_field=IntegerField()),
+    )
+
+
+def rebuild_counters(districts=None):
+    """
+    recomputes the counters from VoteRecord and Profile, optionally only for some districts
+    """
+    with transaction.atomic():
+        rolls = DistrictRoll.objects.all()
+        profiles = Profile.objects.exclude(district='').annotate(key=Lower('district'))
+        if districts is None:
+            BallotTurnout.objects.all().delete()
+            votes = Ballot.objects.annotate(total=Count('voterecord')).values_list('id', 'total')
+            BallotTurnout.objects.bulk_create([BallotTurnout(ballot_id=ballot_id, votes_cast=total)
+                                               for ballot_id, total in votes])
+        else:
+            keys = {district_key(district) for district in districts}
+            rolls = rolls.filter(district__in=keys)
+            profiles = profiles.filter(key__in=keys)
+        rolls.delete()
+        totals = profiles.values_list('key').annotate(total=Count('id')).order_by()
+        DistrictRoll.objects.bulk_create([DistrictRoll(district=key, eligible_voters=total) for key, total in totals])
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_district(sender, instance, **kwargs):
+    # None when the district was deferred
+    instance._counted_district = instance.__dict__.get('district')
+
+
+@receiver(pre_save, sender=Profile)
+def load_deferred_district(sender, instance, **kwargs):
+    if instance.pk is not None and instance._counted_district is None:
+        instance._counted_district = Profile.objects.filter(pk=instance.pk)\
+            .values_list('district', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Profile)
+def update_district_roll(sender, instance, created, **kwargs):
+    old = '' if created else instance._counted_district
+    if district_key(old) != district_key(instance.district):
+        adjust_district(old, -1)
+        adjust_district(instance.district, 1)
+    instance._counted_district = instance.district
+
+
+@receiver(post_delete, sender=Profile)
+def remove_from_district_roll(sender, instance, **kwargs):
+    counted = instance._counted_district
+    adjust_district(instance.district if counted is None else counted, -1)
@@ -0,0 +1,81 @@
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from ballots.forms import AddBallotForm
+from ballots.importer import clean_definition, create_questions
+from ballots.models import BallotFamily, Ballot, Choice, CastVote, PackedCastBallot, BallotTurnout
+from ballots.storage import count_packed_choices, READ_CHUNK_SIZE
+
+
+def clean_districts(districts):
+    if not isinstance(districts, list) or not districts:
+        raise ValidationError('districts must be a non empty list')
+    errors = []
+    cleaned = []
+    for district in districts:
+        try:
+            cleaned.append(AddBallotForm.base_fields['district'].clean(district))
+        except ValidationError as e:
+            errors.extend('district %r: %s' % (district, message) for message in e.messages)
+    if len({district.lower() for district in cleaned}) != len(cleaned):
+        errors.append('districts must not repeat')
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def fan_out(definition):
+    """
+    creates a BallotFamily and one Ballot per district of the definition with bulk inserts in one transaction
+    """
+    districts = clean_districts(definition.get('districts'))
+    ballot_form, questions = clean_definition(dict(definition, district=districts[0]))
+    data = ballot_form.cleaned_data
+    with transaction.atomic():
+        family = BallotFamily.objects.create(
+            ballot_title=data['ballot_title'],
+            ballot_description=data['ballot_description'],
+            pub_date=data['pub_date'],
+            due_date=data['due_date'],
+            definition=[{'question_text': text, 'choices': choices} for text, choices in questions],
+        )
+        Ballot.objects.bulk_create([Ballot(family=family, district=district, ballot_title=family.ballot_title,
+                                           ballot_description=family.ballot_description,
+                                           pub_date=family.pub_date, due_date=family.due_date)
+                                    for district in districts])
+        ballots = list(Ballot.objects.filter(family=family).order_by('id'))
+        create_questions(ballots, questions, family_keys=True)
+    return family
+
+
+def family_choice_counts(family):
+    """
+    returns {choice id: votes} for every ballot of the family with a single GROUP BY over the row format votes
+    """
+    counts = Counter(dict(CastVote.objects.filter(choice__question__ballot__family=family).values_list('choice_id')
+                          .annotate(total=Count('id')).order_by()))
+    packed_rows = PackedCastBallot.objects.filter(assoc_ballot__family=family)\
+        .values_list('choices', flat=True).iterator(chunk_size=READ_CHUNK_SIZE)
+    return count_packed_choices(packed_rows, counts)
+
+
+def family_results(family):
+    """
+    totals the votes of every district of the family per question and choice of the shared definition,
+    returns [(question text, [(choice text, votes)])] and the number of votes cast
+    """
+    counts = family_choice_counts(family)
+    # choices are matched across the family by their key in the definition, their texts are only displayed
+    totals = Counter()
+    choices = Choice.objects.filter(question__ballot__family=family, family_key__isnull=False)\
+        .values_list('family_key', 'id')
+    for family_key, choice_id in choices:
+        totals[family_key] += counts.get(choice_id, 0)
+    keys = iter(range(sum(len(question['choices']) for question in family.definition)))
+    results = [(question['question_text'], [(choice, totals[next(keys)]) for choice in question['choices']])
+               for question in family.definition]
+    votes_cast = BallotTurnout.objects.filter(ballot__family=family).aggregate(total=Sum('votes_cast'))['total'] or 0
+    return results, votes_cast
@@ -2,9 +2,10 @@ from django.utils import timezone
 import datetime
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 from .models import Ballot, Question, Choice
-from django.forms.models import inlineformset_factory
+from django.forms.models import inlineformset_factory, BaseInlineFormSet
 
 def now_plus_7():
     return timezone.now() + datetime.timedelta(days=7)
@@ -37,7 +38,92 @@ class AddBallotForm(forms.ModelForm):
                 raise ValidationError("Invalid publication date - publication must be before due date")
 
 
-BallotQuestionFormset = inlineformset_factory(Ballot, Question, fields=('question_text',))
+class LoadedRowField(forms.ModelChoiceField):
+    """
+    resolves a submitted primary key against rows the formset already loaded instead of querying for each form
+    """
+    def __init__(self, rows, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = rows
 
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            row = self.rows.get(self.queryset.model._meta.pk.to_python(value))
+        except ValidationError:
+            row = None
+        if row is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                                  params={'value': value})
+        return row
 
-QuestionChoiceFormset = inlineformset_factory(Question, Choice, fields=('choice_text',))
+
+class BulkInlineFormSet(BaseInlineFormSet):
+    """
+    inline formset applying its changes with one bulk delete, update and insert in a single transaction
+    rather than one query per form
+    """
+    def loaded_rows(self):
+        if not hasattr(self, '_loaded_rows'):
+            self._loaded_rows = {row.pk: row for row in self.get_queryset()}
+        return self._loaded_rows
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields.get(name)
+        if isinstance(field, forms.ModelChoiceField):
+            form.fields[name] = LoadedRowField(self.loaded_rows(), field.queryset, initial=field.initial,
+                                               required=False, widget=field.widget)
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        deleted_forms = set(self.deleted_forms) if self.can_delete else set()
+        self.deleted_objects = [form.instance for form in self.initial_forms
+                                if form in deleted_forms and form.instance.pk is not None]
+        self.changed_objects = [(form.save(commit=False), form.changed_data) for form in self.initial_forms
+                                if form not in deleted_forms and form.has_changed()]
+        self.new_objects = [form.save(commit=False) for form in self.extra_forms
+                            if form not in deleted_forms and form.has_changed()]
+        with transaction.atomic():
+            if self.deleted_objects:
+                self.model._default_manager.filter(pk__in=[obj.pk for obj in self.deleted_objects]).delete()
+            if self.changed_objects:
+                fields = [name for name in self.form._meta.fields if name != self.fk.name]
+                self.model._default_manager.bulk_update([obj for obj, changed in self.changed_objects], fields)
+            if self.new_objects:
+                self.model._default_manager.bulk_create(self.new_objects)
+        return [obj for obj, changed in self.changed_objects] + self.new_objects
+
+
+BallotQuestionFormset = inlineformset_factory(Ballot, Question, formset=BulkInlineFormSet, fields=('question_text',))
+
+
+QuestionChoiceFormset = inlineformset_factory(Question, Choice, formset=BulkInlineFormSet, fields=('choice_text',))
+
+
+class BallotListFilterForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+
+class ImportBallotForm(forms.Form):
+    definition_file = forms.FileField(required=False, help_text='JSON or YAML ballot definition')
+    definition = forms.CharField(required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 15}))
+    format = forms.ChoiceField(choices=[('json', 'JSON'), ('yaml', 'YAML')], initial='json')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('definition_file')
+        if upload:
+            try:
+                cleaned_data['definition'] = upload.read().decode('utf-8')
+            except UnicodeDecodeError:
+                raise ValidationError("Ballot definition must be UTF-8 text")
+            if upload.name.endswith(('.yaml', '.yml')):
+                cleaned_data['format'] = 'yaml'
+        if not cleaned_data.get('definition'):
+            raise ValidationError("Upload or paste a ballot definition")
+        return cleaned_data
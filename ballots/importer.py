@@ -0,0 +1,123 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from ballots.forms import AddBallotForm, BallotQuestionFormset, QuestionChoiceFormset
+from ballots.models import Question, Choice
+
+# A ballot definition is a mapping of the AddBallotForm fields plus its questions, e.g.
+#
+# ballot_title: Budget
+# ballot_description: Yearly budget vote
+# pub_date: 2022-01-01T00:00:00Z
+# due_date: 2022-02-01T00:00:00Z
+# district: BaltimoreCounty
+# questions:
+#   - question_text: Approve the budget?
+#     choices: [Yes, No]
+
+
+def parse_definition(text, format='json'):
+    if format == 'yaml':
+        # only imported when a YAML definition is uploaded
+        import yaml
+        errors = (ValueError, yaml.YAMLError)
+    else:
+        errors = ValueError
+    try:
+        definition = yaml.safe_load(text) if format == 'yaml' else json.loads(text)
+    except errors as e:
+        raise ValidationError('Ballot definition is not valid %s: %s' % (format.upper(), e))
+    if not isinstance(definition, dict):
+        raise ValidationError('Ballot definition must be a mapping')
+    return definition
+
+
+def _form_errors(prefix, form):
+    return ['%s%s: %s' % (prefix, field, ' '.join(messages)) if field != '__all__' else prefix + ' '.join(messages)
+            for field, messages in form.errors.items()]
+
+
+def clean_definition(definition):
+    """
+    validates a ballot definition with the authoring forms' rules,
+    returns the cleaned ballot form and a list of (question text, [choice texts])
+    """
+    errors = []
+    ballot_form = AddBallotForm(data={field: definition.get(field) for field in AddBallotForm.Meta.fields})
+    if not ballot_form.is_valid():
+        errors.extend(_form_errors('', ballot_form))
+
+    questions = definition.get('questions') or []
+    if not isinstance(questions, list):
+        errors.append('questions must be a list')
+        questions = []
+    cleaned_questions = []
+    for number, question in enumerate(questions, 1):
+        if isinstance(question, str):
+            question = {'question_text': question}
+        if not isinstance(question, dict):
+            errors.append('question %d must be a mapping' % number)
+            continue
+        question_form = BallotQuestionFormset.form(data={'question_text': question.get('question_text')})
+        if not question_form.is_valid():
+            errors.extend(_form_errors('question %d ' % number, question_form))
+            continue
+        choices = question.get('choices') or []
+        if not isinstance(choices, list):
+            errors.append('question %d choices must be a list' % number)
+            continue
+        choice_texts = []
+        for choice_number, choice in enumerate(choices, 1):
+            if isinstance(choice, dict):
+                choice = choice.get('choice_text')
+            choice_form = QuestionChoiceFormset.form(data={'choice_text': choice})
+            if not choice_form.is_valid():
+                errors.extend(_form_errors('question %d choice %d ' % (number, choice_number), choice_form))
+                continue
+            choice_texts.append(choice_form.cleaned_data['choice_text'])
+        cleaned_questions.append((question_form.cleaned_data['question_text'], choice_texts))
+
+    if errors:
+        raise ValidationError(errors)
+    return ballot_form, cleaned_questions
+
+
+def create_questions(ballots, questions, family_keys=False):
+    """
+    bulk creates the same questions and choices on each of the given newly created ballots,
+    with family_keys each choice records its position in the definition (Choice.family_key)
+    """
+    created = Question.objects.bulk_create([Question(ballot=ballot, question_text=text)
+                                            for ballot in ballots for text, choices in questions])
+    if created and created[0].pk is None:
+        # not every backend returns ids from bulk inserts,
+        # the questions were just inserted in order inside this transaction
+        question_ids = {}
+        rows = Question.objects.filter(ballot__in=ballots).order_by('id').values_list('ballot_id', 'id')
+        for ballot_id, question_id in rows:
+            question_ids.setdefault(ballot_id, []).append(question_id)
+        question_ids = {ballot_id: iter(ids) for ballot_id, ids in question_ids.items()}
+        for question in created:
+            question.pk = next(question_ids[question.ballot_id])
+    # the position of each question's first choice among all choices of the definition
+    offsets = [0]
+    for text, choices in questions[:-1]:
+        offsets.append(offsets[-1] + len(choices))
+    Choice.objects.bulk_create([Choice(question=question, choice_text=choice,
+                                       family_key=offsets[index % len(questions)] + position if family_keys else None)
+                                for index, (question, (text, choices)) in enumerate(zip(created, questions * len(ballots)))
+                                for position, choice in enumerate(choices)])
+    return created
+
+
+def import_ballot(definition):
+    """
+    creates a ballot with all of its questions and choices in one transaction
+    """
+    ballot_form, questions = clean_definition(definition)
+    with transaction.atomic():
+        ballot = ballot_form.save()
+        create_questions([ballot], questions)
+    return ballot
@@ -0,0 +1,135 @@
+import datetime
+import logging
+
+from django.core.mail import mail_admins
+from django.db import transaction
+from django.db.models import Min
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from ballots.archive import archivable_ballots, archive_ballot
+from ballots.live import publish_tally
+from ballots.models import Ballot, Choice
+from ballots.storage import choice_counts
+
+# Ballots move draft -> published -> closed -> tallied -> archived as their dates pass.
+# Every transition is a conditional UPDATE on the current state, so when several
+# schedulers run at once exactly one of them performs the work attached to it.
+
+logger = logging.getLogger(__name__)
+
+# sent once per ballot after its tally has been frozen and committed, with ballot and counts.
+# A failing receiver is logged, it must not stop the scheduler from tallying the other ballots.
+ballot_tallied = Signal()
+
+# A vote that passed its checks just before due_date may commit a little after it. Ballots are
+# tallied once this grace period, longer than any request may run (gunicorn.conf.py), has passed.
+TALLY_GRACE = datetime.timedelta(minutes=5)
+
+
+def advance(ballot, from_state, to_state, **conditions):
+    """
+    moves one ballot to to_state if it is still in from_state and matches the extra filter conditions,
+    returns whether this call made the change
+    """
+    changed = Ballot.objects.filter(pk=ballot.pk, state=from_state, **conditions).update(state=to_state)
+    if changed:
+        ballot.state = to_state
+    return bool(changed)
+
+
+def publish_ballots(now):
+    return Ballot.objects.filter(state=Ballot.DRAFT, pub_date__lte=now, due_date__gt=now)\
+        .update(state=Ballot.PUBLISHED)
+
+
+def close_ballots(now):
+    return Ballot.objects.filter(state__in=[Ballot.DRAFT, Ballot.PUBLISHED], due_date__lte=now)\
+        .update(state=Ballot.CLOSED)
+
+
+def tally_ballot(ballot, now=None):
+    """
+    freezes the final counts of a ballot closed for longer than TALLY_GRACE into Choice.votes, returns
+    the counts or None when the ballot was not closed, is still in its grace period or another process
+    tallied it first
+    """
+    with transaction.atomic():
+        now = now or timezone.now()
+        if not advance(ballot, Ballot.CLOSED, Ballot.TALLIED, due_date__lte=now - TALLY_GRACE):
+            return None
+        counts = choice_counts(ballot)
+        choices = list(Choice.objects.filter(question__ballot=ballot))
+        for choice in choices:
+            choice.votes = counts.get(choice.id, 0)
+        Choice.objects.bulk_update(choices, ['votes'])
+
+        def notify():
+            publish_tally(ballot, counts)
+            for receiver_func, response in ballot_tallied.send_robust(sender=Ballot, ballot=ballot, counts=counts):
+                if isinstance(response, Exception):
+                    logger.error('%s failed after tallying ballot %s', receiver_func.__name__, ballot.pk,
+                                 exc_info=response)
+        transaction.on_commit(notify)
+    return counts
+
+
+@receiver(ballot_tallied)
+def email_results(sender, ballot, counts, **kwargs):
+    """
+    emails the frozen results to the site ADMINS
+    """
+    lines = []
+    question_id = None
+    choices = Choice.objects.filter(question__ballot=ballot).select_related('question').order_by('question_id', 'id')
+    for choice in choices:
+        if choice.question_id != question_id:
+            question_id = choice.question_id
+            lines.append(choice.question.question_text)
+        lines.append('    %s: %d' % (choice.choice_text, counts.get(choice.id, 0)))
+    mail_admins('Results of %s' % ballot.ballot_title, '\n'.join(lines))
+
+
+def archive_ballots(now):
+    archived = 0
+    for ballot in archivable_ballots(now).filter(state=Ballot.TALLIED):
+        archive_ballot(ballot)
+        archived += 1
+    return archived
+
+
+def run_lifecycle(now=None):
+    """
+    performs every transition that is due, returns the number of ballots moved into each state
+    """
+    if now is None:
+        now = timezone.now()
+    done = {
+        Ballot.PUBLISHED: publish_ballots(now),
+        Ballot.CLOSED: close_ballots(now),
+        Ballot.TALLIED: 0,
+    }
+    for ballot in Ballot.objects.filter(state=Ballot.CLOSED, due_date__lte=now - TALLY_GRACE).order_by('due_date'):
+        if tally_ballot(ballot, now) is not None:
+            done[Ballot.TALLIED] += 1
+    done[Ballot.ARCHIVED] = archive_ballots(now)
+    return done
+
+
+def next_transition(now=None):
+    """
+    the earliest future time at which a ballot is due to be published, closed or tallied, or None
+    """
+    if now is None:
+        now = timezone.now()
+    times = [
+        Ballot.objects.filter(state=Ballot.DRAFT, pub_date__gt=now).aggregate(next=Min('pub_date'))['next'],
+        Ballot.objects.filter(state__in=[Ballot.DRAFT, Ballot.PUBLISHED], due_date__gt=now)
+        .aggregate(next=Min('due_date'))['next'],
+    ]
+    closed = Ballot.objects.filter(state=Ballot.CLOSED, due_date__gt=now - TALLY_GRACE)\
+        .aggregate(next=Min('due_date'))['next']
+    if closed is not None:
+        times.append(closed + TALLY_GRACE)
+    times = [time for time in times if time is not None]
+    return min(times) if times else None
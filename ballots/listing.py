@@ -0,0 +1,89 @@
+import datetime
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils import timezone
+
+from ballots.counters import with_turnout
+from ballots.forms import BallotListFilterForm
+from ballots.models import Question
+
+# Admin ballot lists are paged by keyset: each page starts after the (date, id) of the last
+# ballot shown instead of at an OFFSET, so late pages cost the same as the first one and
+# rows added meanwhile do not shift ballots between pages.
+
+CURSOR_SEPARATOR = '~'
+
+
+def with_question_count(queryset):
+    questions = Question.objects.filter(ballot=OuterRef('pk')).order_by().values('ballot')\
+        .annotate(total=Count('id')).values('total')
+    return queryset.annotate(question_count=Coalesce(Subquery(questions), Value(0), output_field=IntegerField()))
+
+
+def make_cursor(value, pk):
+    return '%s%s%d' % (value.isoformat(), CURSOR_SEPARATOR, pk)
+
+
+def parse_cursor(cursor):
+    value, separator, pk = cursor.rpartition(CURSOR_SEPARATOR)
+    try:
+        value = datetime.datetime.fromisoformat(value)
+        pk = int(pk)
+    except ValueError:
+        raise Http404('Invalid page')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return value, pk
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class KeysetListMixin:
+    """
+    ListView mixin listing the view's queryset (or model) of ballots by date_field and id one page
+    at a time, with optional ?start= and ?end= dates filtering on date_field. Views narrowing the list
+    by the current time filter super().get_queryset().
+    """
+    page_size = 24
+    date_field = 'due_date'
+    descending = False
+
+    def get_queryset(self):
+        queryset = with_question_count(with_turnout(super().get_queryset()))
+        self.filter_form = BallotListFilterForm(self.request.GET)
+        if self.filter_form.is_valid():
+            start, end = self.filter_form.cleaned_data['start'], self.filter_form.cleaned_data['end']
+            if start:
+                queryset = queryset.filter(**{self.date_field + '__gte': day_start(start)})
+            if end:
+                queryset = queryset.filter(**{self.date_field + '__lt': day_start(end + datetime.timedelta(days=1))})
+
+        cursor = self.request.GET.get('after')
+        if cursor:
+            value, pk = parse_cursor(cursor)
+            lookup = '__lt' if self.descending else '__gt'
+            queryset = queryset.filter(Q(**{self.date_field + lookup: value}) |
+                                       Q(**{self.date_field: value, 'pk' + lookup: pk}))
+        prefix = '-' if self.descending else ''
+        return queryset.order_by(prefix + self.date_field, prefix + 'pk')
+
+    def get_context_data(self, **kwargs):
+        # one row more than a page tells whether there is a next page without counting
+        rows = list(self.object_list[:self.page_size + 1])
+        page = rows[:self.page_size]
+        context = super().get_context_data(object_list=page, **kwargs)
+        context['filter_form'] = self.filter_form
+        if len(rows) > self.page_size:
+            query = self.request.GET.copy()
+            last = page[-1]
+            query['after'] = make_cursor(getattr(last, self.date_field), last.pk)
+            context['next_page_query'] = query.urlencode()
+        if self.request.GET.get('after'):
+            query = self.request.GET.copy()
+            del query['after']
+            context['first_page_query'] = query.urlencode()
+        return context
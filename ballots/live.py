@@ -0,0 +1,197 @@
+import asyncio
+import json
+import re
+import threading
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import transaction
+from django.utils import timezone
+
+from ballots.counters import votes_cast, eligible_voters
+from ballots.models import Ballot
+from ballots.storage import choice_counts
+from users.identity import get_identity
+
+# In-process pub/sub feeding the server-sent event stream of ballot turnout and results.
+# Subscribers are asyncio queues living on the ASGI event loop, so an idle client costs
+# a queue and a coroutine rather than a worker thread. Events only reach the subscribers of the
+# process that published them, so the ASGI server must run the site as a single process for every
+# admin to see every vote. The admin page only subscribes when it was itself served over ASGI,
+# the WSGI deployment (Procfile) has no stream to connect to.
+
+LIVE_PATH = re.compile(r'^/ballot-admin/(?P<ballot_id>[0-9]+)/live$')
+KEEPALIVE_SECONDS = 15
+MAX_QUEUED_EVENTS = 100
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, ballot_id):
+        """
+        must be called from the event loop that will read the returned queue
+        """
+        queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(ballot_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, ballot_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(ballot_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(ballot_id, None)
+
+    def subscriber_count(self, ballot_id):
+        with self._lock:
+            return len(self._subscribers.get(ballot_id, ()))
+
+    def publish(self, ballot_id, event, data):
+        """
+        thread safe, may be called from sync views running outside the event loop
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(ballot_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_enqueue, queue, (event, data))
+            except RuntimeError:
+                # the subscriber's event loop has been closed
+                self.unsubscribe(ballot_id, (loop, queue))
+
+
+def _enqueue(queue, message):
+    # slow clients lose their oldest events rather than growing the queue without bound
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+broker = LocalBroker()
+
+
+def turnout_payload(ballot_id):
+    ballot = Ballot.objects.only('id', 'district').get(pk=ballot_id)
+    return {'ballot': ballot.pk, 'votes_cast': votes_cast(ballot), 'eligible_voters': eligible_voters(ballot.district)}
+
+
+def tally_payload(ballot_id):
+    counts = choice_counts(ballot_id)
+    return {'ballot': ballot_id, 'choices': {str(choice_id): total for choice_id, total in counts.items()}}
+
+
+def publish_turnout(ballot):
+    """
+    publishes the ballot's turnout once the current transaction commits
+    """
+    ballot_id = ballot.pk
+
+    def publish():
+        if broker.subscriber_count(ballot_id):
+            broker.publish(ballot_id, 'turnout', turnout_payload(ballot_id))
+    transaction.on_commit(publish)
+
+
+def publish_tally(ballot, counts):
+    if broker.subscriber_count(ballot.pk):
+        broker.publish(ballot.pk, 'tally', {'ballot': ballot.pk,
+                                            'choices': {str(choice_id): total for choice_id, total in counts.items()}})
+
+
+def format_event(event, data):
+    return ('event: %s\ndata: %s\n\n' % (event, json.dumps(data))).encode()
+
+
+def _load_admin_user(session_key):
+    engine = import_module(settings.SESSION_ENGINE)
+    session_request = type('SessionRequest', (), {})()
+    session_request.session = engine.SessionStore(session_key)
+    user = get_user(session_request)
+    return user.is_authenticated and get_identity(user).has_perms(['ballot.change_ballot'])
+
+
+def _snapshot(ballot_id):
+    ballot = Ballot.objects.filter(pk=ballot_id).only('id', 'due_date').first()
+    if ballot is None:
+        return None
+    events = [('turnout', turnout_payload(ballot_id))]
+    if ballot.due_date <= timezone.now():
+        events.append(('tally', tally_payload(ballot_id)))
+    return events
+
+
+class LiveResultsRouter:
+    """
+    ASGI application serving /ballot-admin/<id>/live as a server-sent event stream
+    and passing every other request on to Django
+    """
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            match = LIVE_PATH.match(scope['path'])
+            if match:
+                return await self.stream(scope, receive, send, int(match.group('ballot_id')))
+        return await self.application(scope, receive, send)
+
+    async def respond(self, send, status, body=b''):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, scope, receive, send, ballot_id):
+        cookies = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        session_cookie = cookies.get(settings.SESSION_COOKIE_NAME)
+        if session_cookie is None or not await sync_to_async(_load_admin_user)(session_cookie.value):
+            return await self.respond(send, 403, b'Forbidden')
+
+        subscriber = broker.subscribe(ballot_id)
+        try:
+            snapshot = await sync_to_async(_snapshot)(ballot_id)
+            if snapshot is None:
+                return await self.respond(send, 404, b'Ballot does not exist')
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            for event, data in snapshot:
+                await send({'type': 'http.response.body', 'body': format_event(event, data), 'more_body': True})
+
+            loop, queue = subscriber
+            disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+            try:
+                while not disconnected.done():
+                    next_event = asyncio.ensure_future(queue.get())
+                    done, pending = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    if next_event in done:
+                        body = format_event(*next_event.result())
+                    else:
+                        next_event.cancel()
+                        if disconnected in done:
+                            break
+                        body = b': keepalive\n\n'
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            finally:
+                disconnected.cancel()
+        finally:
+            broker.unsubscribe(ballot_id, subscriber)
+
+    async def wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ballots.archive import archivable_ballots, archive_ballot
+from ballots.models import Ballot
+
+
+class Command(BaseCommand):
+    help = 'Moves the cast votes of ballots past the archive horizon into compressed cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ballot', type=int, help='Only archive the ballot with this id')
+        parser.add_argument('--dry-run', action='store_true', help='List the ballots that would be archived')
+
+    def handle(self, *args, **options):
+        ballots = archivable_ballots()
+        if options['ballot'] is not None:
+            ballots = ballots.filter(pk=options['ballot'])
+            if not ballots.exists():
+                if not Ballot.objects.filter(pk=options['ballot']).exists():
+                    raise CommandError('Ballot %s does not exist' % options['ballot'])
+                raise CommandError('Ballot %s is not past the archive horizon or is already archived' % options['ballot'])
+
+        for ballot in ballots:
+            if options['dry_run']:
+                self.stdout.write('Would archive "%s" (%s)' % (ballot, ballot.pk))
+                continue
+            archive = archive_ballot(ballot)
+            self.stdout.write(self.style.SUCCESS(
+                'Archived "%s" (%s): %d cast ballots, %d bytes' %
+                (ballot, ballot.pk, archive.cast_ballot_count, len(archive.payload))
+            ))
@@ -0,0 +1,66 @@
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine, engines
+
+from blind_voting_app.startup import project_template_dirs, template_names
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+]
+
+# keeps {% csrf_token %} quiet without a request
+EMPTY_CONTEXT = {'csrf_token': 'NOTPROVIDED'}
+
+
+class Command(BaseCommand):
+    help = 'Times compiling and rendering the project templates with and without the cached template loader ' \
+           'and reports the memory a worker spends keeping them compiled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Benchmark repetitions')
+
+    def make_engine(self, loaders):
+        configured = engines['django'].engine
+        return Engine(dirs=project_template_dirs(), loaders=loaders, libraries=configured.libraries,
+                      builtins=configured.builtins[len(Engine.default_builtins):])
+
+    def handle(self, *args, **options):
+        names = template_names()
+        uncached = self.make_engine(UNCACHED_LOADERS)
+        cached = self.make_engine([('django.template.loaders.cached.Loader', UNCACHED_LOADERS)])
+
+        # templates needing a real context (reversing urls of a ballot, ...) are only compiled
+        renderable = []
+        for name in names:
+            try:
+                uncached.get_template(name).render(Context(EMPTY_CONTEXT))
+                renderable.append(name)
+            except Exception:
+                pass
+        self.stdout.write('%d templates, %d render with an empty context' % (len(names), len(renderable)))
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for name in names:
+            cached.get_template(name)
+        held = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+
+        for label, engine in [('uncached', uncached), ('cached', cached)]:
+            self.report(label + ' load', lambda: [engine.get_template(name) for name in names], options['repeat'])
+            self.report(label + ' render', lambda: [engine.get_template(name).render(Context(EMPTY_CONTEXT)) for name in renderable],
+                        options['repeat'])
+        self.stdout.write('compiled templates held per worker: %.1f KiB' % (held / 1024))
+        self.stdout.write('worker max RSS: %.1f MiB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+    def report(self, label, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write('%-16s best %.2f ms, mean %.2f ms' %
+                          (label, min(timings) * 1000, sum(timings) / len(timings) * 1000))
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ballots.families import fan_out
+from ballots.importer import parse_definition, import_ballot
+
+
+class Command(BaseCommand):
+    help = 'Creates a ballot with its questions and choices from a JSON or YAML definition file, ' \
+           'definitions listing several districts create one ballot per district'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Definition file, - reads standard input')
+        parser.add_argument('--format', choices=['json', 'yaml'],
+                            help='Defaults to yaml for .yaml/.yml files and json otherwise')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('yaml' if path.endswith(('.yaml', '.yml')) else 'json')
+        try:
+            if path == '-':
+                text = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8') as definition_file:
+                    text = definition_file.read()
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            definition = parse_definition(text, format)
+            if 'districts' in definition:
+                family = fan_out(definition)
+            else:
+                ballot = import_ballot(definition)
+        except ValidationError as e:
+            raise CommandError('Invalid ballot definition:\n' + '\n'.join(e.messages))
+        if 'districts' in definition:
+            self.stdout.write(self.style.SUCCESS('Imported "%s" (family %s) for %d districts' %
+                                                 (family, family.pk, family.ballots.count())))
+            return
+        self.stdout.write(self.style.SUCCESS('Imported "%s" (%s) with %d questions' %
+                                             (ballot, ballot.pk, ballot.question_set.count())))
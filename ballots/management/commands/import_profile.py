@@ -0,0 +1,110 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'blind_voting_app' / 'import_baseline.json'
+
+# run in a fresh interpreter so nothing is imported yet, every manage.py command pays for "setup",
+# a web worker additionally for "urls" (the views and everything they import)
+PROFILE_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+sys.stderr.write('import time: phase urls\\n')
+from django.urls import get_resolver
+get_resolver().url_patterns
+sys.stdout.write('%f %f' % (setup - start, time.perf_counter() - setup))
+'''
+
+PHASES = ['setup', 'urls']
+
+
+def parse_importtime(output):
+    """
+    returns {phase: {top level module: cumulative ms}} from the -X importtime lines of one run
+    """
+    phases = {phase: {} for phase in PHASES}
+    modules = phases['setup']
+    for line in output.splitlines():
+        if line == 'import time: phase urls':
+            modules = phases['urls']
+            continue
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        # nested imports are indented below the module that triggered them
+        if name.startswith(' ' * 3):
+            continue
+        modules[name.strip()] = int(parts[1]) / 1000
+    return phases
+
+
+class Command(BaseCommand):
+    help = 'Profiles the imports of a fresh process setting up Django and loading the urls, ' \
+           'compared against the baseline recorded in blind_voting_app/import_baseline.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs to take the best timings of')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest modules listed per phase')
+        parser.add_argument('--save-baseline', action='store_true', help='Record these timings as the baseline')
+        parser.add_argument('--max-regression', type=float,
+                            help='Fail when a phase is more than this many percent slower than the baseline')
+
+    def profile(self):
+        # inherits DJANGO_SETTINGS_MODULE and the rest of manage.py's environment
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT],
+                                cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError('Profiled process failed:\n' + result.stderr[-2000:])
+        wall = dict(zip(PHASES, (float(seconds) * 1000 for seconds in result.stdout.split())))
+        return wall, parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        wall = {phase: None for phase in PHASES}
+        modules = {phase: {} for phase in PHASES}
+        # imports are cached by the OS after the first run, keep the best of each
+        for _ in range(max(options['repeat'], 1)):
+            run_wall, run_modules = self.profile()
+            for phase in PHASES:
+                if wall[phase] is None or run_wall[phase] < wall[phase]:
+                    wall[phase] = run_wall[phase]
+                for name, ms in run_modules[phase].items():
+                    modules[phase][name] = min(ms, modules[phase].get(name, ms))
+
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else None
+        regressions = []
+        for phase in PHASES:
+            line = '%-6s %8.1f ms' % (phase, wall[phase])
+            if baseline:
+                before = baseline['phases'][phase]
+                change = (wall[phase] - before) / before * 100
+                line += '  baseline %8.1f ms  %+6.1f%%' % (before, change)
+                if options['max_regression'] is not None and change > options['max_regression']:
+                    regressions.append(phase)
+            self.stdout.write(line)
+            slowest = sorted(modules[phase].items(), key=lambda item: -item[1])[:options['top']]
+            for name, ms in slowest:
+                line = '    %-40s %8.1f ms' % (name, ms)
+                if baseline and name in baseline['modules'].get(phase, {}):
+                    line += '  baseline %8.1f ms' % baseline['modules'][phase][name]
+                self.stdout.write(line)
+
+        if options['save_baseline']:
+            BASELINE_PATH.write_text(json.dumps({
+                'python': sys.version.split()[0],
+                'phases': {phase: round(wall[phase], 1) for phase in PHASES},
+                'modules': {phase: {name: round(ms, 1) for name, ms in
+                                    sorted(modules[phase].items(), key=lambda item: -item[1])[:options['top']]}
+                            for phase in PHASES},
+            }, indent=2) + '\n')
+            self.stdout.write('Baseline saved to %s' % BASELINE_PATH)
+        if regressions:
+            raise CommandError('Import time regressed by more than %s%%: %s' %
+                               (options['max_regression'], ', '.join(regressions)))
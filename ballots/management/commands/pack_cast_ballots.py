@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ballots.models import Ballot
+from ballots.storage import pack_cast_ballots
+
+
+class Command(BaseCommand):
+    help = 'Converts row format cast ballots (CastBallot/CastVote) into one packed row per cast ballot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ballot_ids', nargs='*', type=int, help='Ballots to convert, defaults to every ballot')
+
+    def handle(self, *args, **options):
+        ballots = Ballot.objects.order_by('id')
+        if options['ballot_ids']:
+            ballots = ballots.filter(pk__in=options['ballot_ids'])
+            missing = set(options['ballot_ids']) - set(ballots.values_list('id', flat=True))
+            if missing:
+                raise CommandError('Ballots %s do not exist' % ', '.join(str(pk) for pk in sorted(missing)))
+        for ballot in ballots:
+            converted = pack_cast_ballots(ballot)
+            if converted:
+                self.stdout.write(self.style.SUCCESS('Packed %d cast ballots of "%s" (%s)' % (converted, ballot, ballot.pk)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ballots.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the ballot turnout and district roll counters from VoteRecord and Profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--district', action='append', dest='districts',
+                            help='Only rebuild the roll of this district, may be repeated')
+
+    def handle(self, *args, **options):
+        rebuild_counters(options['districts'])
+        self.stdout.write(self.style.SUCCESS('Turnout counters rebuilt'))
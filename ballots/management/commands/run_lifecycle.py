@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ballots.lifecycle import run_lifecycle, next_transition
+
+
+class Command(BaseCommand):
+    help = 'Publishes, closes, tallies and archives the ballots whose dates have passed. ' \
+           'With --loop it keeps running and wakes up whenever the next ballot is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running as a scheduler')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Longest time to sleep between runs in seconds when looping')
+
+    def handle(self, *args, **options):
+        while True:
+            done = run_lifecycle()
+            for state, count in done.items():
+                if count:
+                    self.stdout.write(self.style.SUCCESS('%d ballot(s) %s' % (count, state)))
+            if not options['loop']:
+                return
+            now = timezone.now()
+            wait = options['interval']
+            upcoming = next_transition(now)
+            if upcoming is not None:
+                wait = min(wait, max((upcoming - now).total_seconds(), 0.5))
+            time.sleep(wait)
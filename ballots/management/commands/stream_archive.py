@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ballots.archive import iter_archived_cast_ballots, ArchiveChecksumError
+from ballots.models import BallotArchive
+
+
+class Command(BaseCommand):
+    help = 'Streams the archived cast ballots of a ballot as json lines for auditing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ballot_id', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            archive = BallotArchive.objects.get(ballot_id=options['ballot_id'])
+        except BallotArchive.DoesNotExist:
+            raise CommandError('Ballot %s has not been archived' % options['ballot_id'])
+        try:
+            for cast_id, choice_ids in iter_archived_cast_ballots(archive):
+                self.stdout.write(json.dumps({'cast_ballot': cast_id, 'choices': choice_ids}))
+        except ArchiveChecksumError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ballots.models import Ballot, Question, Choice, CastVote
+from ballots.storage import choice_counts
+from ballots.tally import compute_tally
+
+
+class Command(BaseCommand):
+    help = 'Tallies a ballot with the vectorized tally engine, optionally cross tabulating questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ballot_id', type=int)
+        parser.add_argument('--crosstab', nargs=2, type=int, action='append', default=[],
+                            metavar=('QUESTION_ID', 'QUESTION_ID'), help='Cross tabulate two questions')
+        parser.add_argument('--save', action='store_true', help='Store the counts on the choices')
+        parser.add_argument('--benchmark', action='store_true', help='Time the tally against the ORM paths')
+        parser.add_argument('--repeat', type=int, default=3, help='Benchmark repetitions')
+
+    def handle(self, *args, **options):
+        try:
+            ballot = Ballot.objects.get(pk=options['ballot_id'])
+        except Ballot.DoesNotExist:
+            raise CommandError('Ballot %s does not exist' % options['ballot_id'])
+        crosstabs = [tuple(pair) for pair in options['crosstab']]
+        question_ids = set(Question.objects.filter(ballot=ballot).values_list('id', flat=True))
+        for pair in crosstabs:
+            if not set(pair) <= question_ids:
+                raise CommandError('Questions %s and %s are not both on ballot %s' % (pair + (ballot.pk,)))
+
+        tally = compute_tally(ballot, crosstabs)
+        choices = Choice.objects.filter(question__ballot=ballot).select_related('question').order_by('question_id', 'id')
+        texts = {choice.id: choice.choice_text for choice in choices}
+        counts = tally.choice_counts()
+        turnout = tally.question_turnout()
+
+        self.stdout.write('%s: %d cast ballots' % (ballot, tally.cast_ballots))
+        current_question = None
+        for choice in choices:
+            if choice.question_id != current_question:
+                current_question = choice.question_id
+                self.stdout.write('%s (%d answered)' % (choice.question, turnout.get(choice.question_id, 0)))
+            self.stdout.write('    %s: %d' % (choice.choice_text, counts[choice.id]))
+
+        for question1, question2 in crosstabs:
+            rows, cols, matrix = tally.crosstab(question1, question2)
+            self.stdout.write('Cross tabulation of questions %s x %s' % (question1, question2))
+            self.stdout.write('\t' + '\t'.join(texts[choice_id] for choice_id in cols))
+            for choice_id, row in zip(rows, matrix):
+                self.stdout.write(texts[choice_id] + '\t' + '\t'.join(str(value) for value in row))
+
+        if options['save']:
+            choices = list(choices)
+            for choice in choices:
+                choice.votes = counts[choice.id]
+            Choice.objects.bulk_update(choices, ['votes'])
+
+        if options['benchmark']:
+            self.benchmark(ballot, crosstabs, options['repeat'])
+
+    def benchmark(self, ballot, crosstabs, repeat):
+        def per_choice_count():
+            return {choice.id: CastVote.objects.filter(choice=choice).count()
+                    for choice in Choice.objects.filter(question__ballot=ballot)}
+
+        paths = [
+            ('numpy', lambda: compute_tally(ballot, crosstabs)),
+            ('orm group by', lambda: choice_counts(ballot)),
+            ('orm per choice', per_choice_count),
+        ]
+        for name, run in paths:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write('%-15s best %.2f ms, mean %.2f ms' %
+                              (name, min(timings) * 1000, sum(timings) / len(timings) * 1000))
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0003_auto_20211119_0425'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BallotArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date archived')),
+                ('cast_ballot_count', models.IntegerField(default=0)),
+                ('tallies', models.JSONField(default=dict)),
+                ('payload', models.BinaryField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('ballot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='ballots.ballot')),
+            ],
+        ),
+    ]
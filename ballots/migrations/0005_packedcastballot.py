@@ -0,0 +1,22 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0004_ballotarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedCastBallot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choices', models.BinaryField()),
+                ('assoc_ballot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ballots.ballot')),
+            ],
+        ),
+    ]
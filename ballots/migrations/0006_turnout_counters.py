@@ -0,0 +1,49 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:31
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    Ballot = apps.get_model('ballots', 'Ballot')
+    BallotTurnout = apps.get_model('ballots', 'BallotTurnout')
+    DistrictRoll = apps.get_model('ballots', 'DistrictRoll')
+    Profile = apps.get_model('users', 'Profile')
+
+    votes = Ballot.objects.annotate(votes_cast=Count('voterecord')).values_list('id', 'votes_cast')
+    BallotTurnout.objects.bulk_create([BallotTurnout(ballot_id=ballot_id, votes_cast=votes_cast)
+                                       for ballot_id, votes_cast in votes])
+    rolls = Profile.objects.exclude(district='').annotate(key=Lower('district')).values_list('key')\
+        .annotate(total=Count('id')).order_by()
+    DistrictRoll.objects.bulk_create([DistrictRoll(district=district, eligible_voters=total)
+                                      for district, total in rolls])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0005_packedcastballot'),
+        ('users', '0003_alter_profile_ssn'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictRoll',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('district', models.CharField(max_length=50, unique=True)),
+                ('eligible_voters', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BallotTurnout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votes_cast', models.IntegerField(default=0)),
+                ('ballot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='turnout', to='ballots.ballot')),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
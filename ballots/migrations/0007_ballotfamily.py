@@ -0,0 +1,30 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0006_turnout_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BallotFamily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ballot_title', models.TextField(default='', max_length=200)),
+                ('ballot_description', models.TextField(blank=True, default='', max_length=200)),
+                ('pub_date', models.DateTimeField(verbose_name='date published')),
+                ('due_date', models.DateTimeField(verbose_name='due date')),
+                ('definition', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ballot',
+            name='family',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ballots', to='ballots.ballotfamily'),
+        ),
+    ]
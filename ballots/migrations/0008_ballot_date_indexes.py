@@ -0,0 +1,21 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0007_ballotfamily'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ballot',
+            index=models.Index(fields=['pub_date', 'id'], name='ballot_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ballot',
+            index=models.Index(fields=['due_date', 'id'], name='ballot_due_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:42
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_states(apps, schema_editor):
+    Ballot = apps.get_model('ballots', 'Ballot')
+    now = timezone.now()
+    Ballot.objects.filter(pub_date__lte=now, due_date__gt=now).update(state='published')
+    # closed ballots are tallied by the next run of the lifecycle command
+    Ballot.objects.filter(due_date__lte=now).update(state='closed')
+    Ballot.objects.filter(archive__isnull=False).update(state='archived')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0008_ballot_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ballot',
+            name='state',
+            field=models.CharField(choices=[('draft', 'Draft'), ('published', 'Published'), ('closed', 'Closed'), ('tallied', 'Tallied'), ('archived', 'Archived')], db_index=True, default='draft', editable=False, max_length=10),
+        ),
+        migrations.RunPython(backfill_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.8 on 2026-10-19 18:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Count, Min
+
+
+def remove_duplicate_vote_records(apps, schema_editor):
+    # left by concurrent submissions before the constraint, the first record of each voter is kept
+    VoteRecord = apps.get_model('ballots', 'VoteRecord')
+    duplicates = VoteRecord.objects.values('assoc_ballot', 'voter_signature')\
+        .annotate(count=Count('id'), first=Min('id')).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        VoteRecord.objects.filter(assoc_ballot=duplicate['assoc_ballot'], voter_signature=duplicate['voter_signature'])\
+            .exclude(id=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0009_ballot_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('voter_signature', models.CharField(max_length=50)),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_vote_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='voterecord',
+            constraint=models.UniqueConstraint(fields=('assoc_ballot', 'voter_signature'), name='one_vote_per_voter'),
+        ),
+        migrations.AddField(
+            model_name='votesubmission',
+            name='assoc_ballot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ballots.ballot'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.8 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+def backfill_family_keys(apps, schema_editor):
+    # fan_out created the questions and choices of every ballot in definition order
+    BallotFamily = apps.get_model('ballots', 'BallotFamily')
+    Choice = apps.get_model('ballots', 'Choice')
+    for family in BallotFamily.objects.all():
+        offsets = [0]
+        for question in family.definition[:-1]:
+            offsets.append(offsets[-1] + len(question['choices']))
+        question_positions = {}
+        choice_positions = {}
+        keyed = []
+        choices = Choice.objects.filter(question__ballot__family=family)\
+            .order_by('question__ballot_id', 'question_id', 'id').select_related('question')
+        for choice in choices:
+            positions = question_positions.setdefault(choice.question.ballot_id, {})
+            question_position = positions.setdefault(choice.question_id, len(positions))
+            choice_position = choice_positions.get(choice.question_id, 0)
+            choice_positions[choice.question_id] = choice_position + 1
+            if question_position < len(family.definition) \
+                    and choice_position < len(family.definition[question_position]['choices']):
+                choice.family_key = offsets[question_position] + choice_position
+                keyed.append(choice)
+        Choice.objects.bulk_update(keyed, ['family_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0010_vote_submission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='family_key',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_family_keys, migrations.RunPython.noop),
+    ]
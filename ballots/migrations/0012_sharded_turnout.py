@@ -0,0 +1,28 @@
+# Generated by Django 3.2.8 on 2026-10-19 18:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ballots', '0011_choice_family_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ballotturnout',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='ballotturnout',
+            name='ballot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turnout', to='ballots.ballot'),
+        ),
+        migrations.AddConstraint(
+            model_name='ballotturnout',
+            constraint=models.UniqueConstraint(fields=('ballot', 'shard'), name='one_turnout_per_shard'),
+        ),
+    ]
@@ -19,12 +19,48 @@ def now_plus_30():
     return timezone.now() + datetime.timedelta(days=30)
 
 
+# A ballot defined once and fanned out to one Ballot per district, see ballots.families.
+# definition keeps the shared question and choice texts.
+class BallotFamily(models.Model):
+    ballot_title = models.TextField(max_length=200, default="")
+    ballot_description = models.TextField(max_length=200, default="", blank=True)
+    pub_date = models.DateTimeField('date published')
+    due_date = models.DateTimeField('due date')
+    definition = models.JSONField(default=list)
+
+    def __str__(self):
+        return self.ballot_title
+
+
 class Ballot(models.Model):
+    # lifecycle states, advanced by ballots.lifecycle
+    DRAFT = 'draft'
+    PUBLISHED = 'published'
+    CLOSED = 'closed'
+    TALLIED = 'tallied'
+    ARCHIVED = 'archived'
+    STATE_CHOICES = [
+        (DRAFT, 'Draft'),
+        (PUBLISHED, 'Published'),
+        (CLOSED, 'Closed'),
+        (TALLIED, 'Tallied'),
+        (ARCHIVED, 'Archived'),
+    ]
+
     ballot_title = models.TextField(max_length=200, default="")
     ballot_description = models.TextField(max_length=200, default="", blank=True)
     pub_date = models.DateTimeField('date published', default=now_plus_7)
     due_date = models.DateTimeField('due date', default=now_plus_30)
     district = models.CharField(max_length=50, blank=True)
+    family = models.ForeignKey(BallotFamily, on_delete=models.SET_NULL, null=True, blank=True, related_name='ballots')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=DRAFT, editable=False, db_index=True)
+
+    class Meta:
+        # the admin lists page through ballots by date and id
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='ballot_pub_date_idx'),
+            models.Index(fields=['due_date', 'id'], name='ballot_due_date_idx'),
+        ]
 
     def was_published_recently(self):
         now = timezone.now()
@@ -54,6 +90,9 @@ class Choice(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
     votes = models.IntegerField(default=0, editable=False)
+    # position of the choice among all choices of its BallotFamily definition, the same on every
+    # ballot of the family, null for choices of ballots outside a family or added to one later
+    family_key = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.choice_text
@@ -65,6 +104,59 @@ class CastVote(models.Model):
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     ballot = models.ForeignKey(CastBallot, on_delete=models.CASCADE)
 
+# Compact alternative to CastBallot/CastVote, one row per cast ballot.
+# choices holds the sorted selected choice ids packed as little endian int64s, see ballots.storage
+class PackedCastBallot(models.Model):
+    assoc_ballot = models.ForeignKey(Ballot, on_delete=models.CASCADE)
+    choices = models.BinaryField()
+
 class VoteRecord(models.Model):
     assoc_ballot = models.ForeignKey(Ballot, on_delete=models.CASCADE)
-    voter_signature = models.CharField(max_length=50)
\ No newline at end of file
+    voter_signature = models.CharField(max_length=50)
+
+    class Meta:
+        # a second concurrent vote of the same voter fails here rather than being counted
+        constraints = [
+            models.UniqueConstraint(fields=['assoc_ballot', 'voter_signature'], name='one_vote_per_voter'),
+        ]
+
+# The key of a submitted ballot form (see detail.html), a resubmission of the same form is
+# recognised from it without running the vote again. Holds no choices.
+class VoteSubmission(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    assoc_ballot = models.ForeignKey(Ballot, on_delete=models.CASCADE)
+    voter_signature = models.CharField(max_length=50)
+    submitted_at = models.DateTimeField(default=timezone.now)
+
+# Maintained turnout counters, see ballots.counters
+# A ballot's votes are counted on several shards, its turnout is their sum
+class BallotTurnout(models.Model):
+    ballot = models.ForeignKey(Ballot, on_delete=models.CASCADE, related_name='turnout')
+    shard = models.PositiveSmallIntegerField(default=0)
+    votes_cast = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ballot', 'shard'], name='one_turnout_per_shard'),
+        ]
+
+class DistrictRoll(models.Model):
+    # lowercased, ballots and profiles match districts case insensitively
+    district = models.CharField(max_length=50, unique=True)
+    eligible_voters = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.district
+
+# Cold storage for the raw cast votes of a ballot past the archive horizon.
+# payload is a zlib compressed stream of json lines, one per cast ballot.
+class BallotArchive(models.Model):
+    ballot = models.OneToOneField(Ballot, on_delete=models.CASCADE, related_name='archive')
+    archived_at = models.DateTimeField('date archived', default=timezone.now)
+    cast_ballot_count = models.IntegerField(default=0)
+    tallies = models.JSONField(default=dict)
+    payload = models.BinaryField()
+    checksum = models.CharField(max_length=64)
+
+    def __str__(self):
+        return 'Archive of %s' % self.ballot
\ No newline at end of file
@@ -0,0 +1,138 @@
+import sys
+from array import array
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from ballots.models import CastBallot, CastVote, PackedCastBallot
+
+# 'rows' stores one CastVote row per selected choice, 'packed' stores one PackedCastBallot row per cast ballot
+ROWS = 'rows'
+PACKED = 'packed'
+
+READ_CHUNK_SIZE = 2000
+
+
+def get_cast_storage():
+    return getattr(settings, 'BALLOTS_CAST_STORAGE', ROWS)
+
+
+def pack_choice_ids(choice_ids):
+    packed = array('q', sorted(choice_ids))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_choice_ids(data):
+    unpacked = array('q')
+    unpacked.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked.tolist()
+
+
+def record_cast_ballot(ballot, choices):
+    """
+    stores the anonymous cast ballot for the selected choices in the configured storage format
+    """
+    if get_cast_storage() == PACKED:
+        PackedCastBallot.objects.create(assoc_ballot=ballot, choices=pack_choice_ids(choice.id for choice in choices))
+        return
+    new_ballot = CastBallot.objects.create(assoc_ballot=ballot)
+    CastVote.objects.bulk_create([CastVote(choice=choice, ballot=new_ballot) for choice in choices])
+
+
+def _iter_row_cast_ballots(ballot):
+    rows = CastVote.objects.filter(ballot__assoc_ballot=ballot).order_by('ballot_id', 'choice_id')\
+        .values_list('ballot_id', 'choice_id').iterator(chunk_size=READ_CHUNK_SIZE)
+    current_id = None
+    choice_ids = []
+    for cast_id, choice_id in rows:
+        if cast_id != current_id:
+            if current_id is not None:
+                yield current_id, choice_ids
+            current_id = cast_id
+            choice_ids = []
+        choice_ids.append(choice_id)
+    if current_id is not None:
+        yield current_id, choice_ids
+
+
+def iter_cast_ballots(ballot):
+    """
+    yields (cast ballot id, [choice ids]) for every cast ballot of a ballot in either storage format,
+    streaming the rows in chunks. Packed cast ballots are given negative ids, as in ballots.tally, so they
+    never collide with row format cast ballots.
+    """
+    yield from _iter_row_cast_ballots(ballot)
+    packed_rows = PackedCastBallot.objects.filter(assoc_ballot=ballot).order_by('id')\
+        .values_list('id', 'choices').iterator(chunk_size=READ_CHUNK_SIZE)
+    for cast_id, packed in packed_rows:
+        yield -cast_id, unpack_choice_ids(packed)
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def count_packed_choices(packed_rows, counts):
+    """
+    adds the choices of packed cast ballots to counts, counted by numpy over READ_CHUNK_SIZE of them at a time
+    """
+    # numpy is only needed here, not in every process importing the urls
+    import numpy as np
+
+    for batch in batches(packed_rows, READ_CHUNK_SIZE):
+        choice_ids = np.frombuffer(b''.join(bytes(packed) for packed in batch), dtype='<i8')
+        if not len(choice_ids):
+            continue
+        # a ballot's choice ids are close together, counting from the lowest keeps the bins few
+        low = int(choice_ids.min())
+        totals = np.bincount(choice_ids - low)
+        present = np.flatnonzero(totals)
+        counts.update(dict(zip((present + low).tolist(), totals[present].tolist())))
+    return counts
+
+
+def choice_counts(ballot):
+    """
+    returns {choice id: number of votes} for a ballot across both storage formats,
+    the row format votes are counted by the database
+    """
+    counts = Counter(dict(CastVote.objects.filter(choice__question__ballot=ballot).values_list('choice_id')
+                          .annotate(total=Count('id')).order_by()))
+    packed_rows = PackedCastBallot.objects.filter(assoc_ballot=ballot)\
+        .values_list('choices', flat=True).iterator(chunk_size=READ_CHUNK_SIZE)
+    return count_packed_choices(packed_rows, counts)
+
+
+def delete_cast_ballots(ballot):
+    CastVote.objects.filter(ballot__assoc_ballot=ballot).delete()
+    CastBallot.objects.filter(assoc_ballot=ballot).delete()
+    PackedCastBallot.objects.filter(assoc_ballot=ballot).delete()
+
+
+def pack_cast_ballots(ballot, batch_size=1000):
+    """
+    converts the row format cast ballots of a ballot into packed rows batch_size at a time,
+    returns the number converted
+    """
+    converted = 0
+    with transaction.atomic():
+        cast_ballots = _iter_row_cast_ballots(ballot)
+        for batch in batches(cast_ballots, batch_size):
+            PackedCastBallot.objects.bulk_create([PackedCastBallot(assoc_ballot=ballot, choices=pack_choice_ids(choice_ids))
+                                                  for cast_id, choice_ids in batch])
+            converted += len(batch)
+        CastVote.objects.filter(ballot__assoc_ballot=ballot).delete()
+        CastBallot.objects.filter(assoc_ballot=ballot).delete()
+    return converted
@@ -0,0 +1,135 @@
+import numpy as np
+
+from ballots.models import Choice, CastBallot, CastVote, PackedCastBallot
+
+CHUNK_SIZE = 50000
+
+
+def stream_cast_votes(ballot, chunk_size=CHUNK_SIZE):
+    """
+    yields (cast ballot ids, choice ids) int64 array pairs for every vote of a ballot, chunk_size votes at a time.
+    Packed cast ballots are given negative ids so they never collide with row format cast ballots.
+    """
+    rows = CastVote.objects.filter(ballot__assoc_ballot=ballot).values_list('ballot_id', 'choice_id')\
+        .order_by().iterator(chunk_size=chunk_size)
+    cast_ids = []
+    choice_ids = []
+    for cast_id, choice_id in rows:
+        cast_ids.append(cast_id)
+        choice_ids.append(choice_id)
+        if len(cast_ids) >= chunk_size:
+            yield np.array(cast_ids, dtype=np.int64), np.array(choice_ids, dtype=np.int64)
+            cast_ids = []
+            choice_ids = []
+    if cast_ids:
+        yield np.array(cast_ids, dtype=np.int64), np.array(choice_ids, dtype=np.int64)
+
+    packed_rows = PackedCastBallot.objects.filter(assoc_ballot=ballot).values_list('id', 'choices')\
+        .order_by().iterator(chunk_size=chunk_size)
+    ids = []
+    buffers = []
+    for cast_id, packed in packed_rows:
+        ids.append(-cast_id)
+        buffers.append(bytes(packed))
+        if len(ids) >= chunk_size:
+            yield _unpack_chunk(ids, buffers)
+            ids = []
+            buffers = []
+    if ids:
+        yield _unpack_chunk(ids, buffers)
+
+
+def _unpack_chunk(ids, buffers):
+    choice_ids = np.frombuffer(b''.join(buffers), dtype='<i8').astype(np.int64)
+    lengths = np.fromiter((len(buffer) // 8 for buffer in buffers), dtype=np.int64, count=len(buffers))
+    return np.repeat(np.array(ids, dtype=np.int64), lengths), choice_ids
+
+
+class BallotTally:
+    """
+    per choice counts, per question turnout and question x question cross tabulations of a ballot
+    """
+    def __init__(self, choice_ids, question_ids, counts, cast_ballots, crosstabs):
+        self.choice_ids = choice_ids
+        self.question_ids = question_ids
+        self.counts = counts
+        self.cast_ballots = cast_ballots
+        self.crosstabs = crosstabs
+
+    def choice_counts(self):
+        return {int(choice_id): int(count) for choice_id, count in zip(self.choice_ids, self.counts)}
+
+    def question_turnout(self):
+        """
+        number of cast ballots answering each question, a cast ballot selects at most one choice per question
+        """
+        questions, question_index = np.unique(self.question_ids, return_inverse=True)
+        turnout = np.bincount(question_index, weights=self.counts, minlength=len(questions))
+        return {int(question_id): int(total) for question_id, total in zip(questions, turnout)}
+
+    def crosstab(self, question1, question2):
+        """
+        returns (question1 choice ids, question2 choice ids, matrix) where matrix[i][j] counts the cast ballots
+        that selected both the i-th choice of question1 and the j-th choice of question2
+        """
+        matrix = self.crosstabs[(question1, question2)]
+        return (self.choice_ids[self.question_ids == question1].tolist(),
+                self.choice_ids[self.question_ids == question2].tolist(), matrix)
+
+
+def compute_tally(ballot, crosstabs=(), chunk_size=CHUNK_SIZE):
+    """
+    streams the cast votes of a ballot into numpy arrays and tallies them with bincount.
+    crosstabs is a list of (question id, question id) pairs to cross tabulate
+    """
+    choices = np.array(list(Choice.objects.filter(question__ballot=ballot).order_by('id')
+                            .values_list('id', 'question_id')), dtype=np.int64).reshape(-1, 2)
+    choice_ids = choices[:, 0]
+    question_ids = choices[:, 1]
+    counts = np.zeros(len(choice_ids), dtype=np.int64)
+
+    wanted_questions = {question_id for pair in crosstabs for question_id in pair}
+    wanted = np.isin(question_ids, list(wanted_questions))
+    pair_casts = []
+    pair_choices = []
+
+    for cast_chunk, choice_chunk in stream_cast_votes(ballot, chunk_size):
+        choice_index = np.searchsorted(choice_ids, choice_chunk)
+        # drop votes for choices that are not on this ballot
+        known = choice_index < len(choice_ids)
+        known[known] = choice_ids[choice_index[known]] == choice_chunk[known]
+        choice_index = choice_index[known]
+        cast_chunk = cast_chunk[known]
+        counts += np.bincount(choice_index, minlength=len(choice_ids))
+        if wanted_questions:
+            keep = wanted[choice_index]
+            pair_casts.append(cast_chunk[keep])
+            pair_choices.append(choice_index[keep])
+
+    tables = {}
+    if wanted_questions:
+        casts = np.concatenate(pair_casts) if pair_casts else np.zeros(0, dtype=np.int64)
+        selected = np.concatenate(pair_choices) if pair_choices else np.zeros(0, dtype=np.int64)
+        cast_ids, cast_index = np.unique(casts, return_inverse=True)
+        for question1, question2 in crosstabs:
+            tables[(question1, question2)] = _crosstab(question_ids, cast_ids, cast_index, selected,
+                                                       question1, question2)
+
+    cast_ballots = CastBallot.objects.filter(assoc_ballot=ballot).count() + \
+        PackedCastBallot.objects.filter(assoc_ballot=ballot).count()
+    return BallotTally(choice_ids, question_ids, counts, cast_ballots, tables)
+
+
+def _crosstab(question_ids, cast_ids, cast_index, selected, question1, question2):
+    columns = []
+    for question_id in (question1, question2):
+        in_question = question_ids == question_id
+        # position of every choice within its question, -1 for choices of other questions
+        local = np.where(in_question, np.cumsum(in_question) - 1, -1)
+        column = np.full(len(cast_ids), -1, dtype=np.int64)
+        mask = local[selected] >= 0
+        column[cast_index[mask]] = local[selected[mask]]
+        columns.append((column, int(in_question.sum())))
+    (first, rows), (second, cols) = columns
+    both = (first >= 0) & (second >= 0)
+    return np.bincount(first[both] * cols + second[both], minlength=rows * cols).reshape(rows, cols)
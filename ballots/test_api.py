@@ -0,0 +1,124 @@
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .counters import votes_cast
+from .models import Ballot, Question, Choice, VoteRecord, CastVote
+from users.identity import blinded_signature
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.choice = Choice.objects.create(choice_text="A", question=self.question)
+        self.other_choice = Choice.objects.create(choice_text="B", question=self.question)
+        self.client.force_login(self.user)
+
+    def url(self, name, ballot=None):
+        kwargs = {} if name == 'ballots' else {'ballot_id': (ballot or self.ballot).pk}
+        return reverse('api-v1:' + name, kwargs=kwargs)
+
+    def post_vote(self, choices, ballot=None, **data):
+        data['choices'] = {str(question.pk): choice.pk for question, choice in choices}
+        return self.client.post(self.url('vote', ballot), json.dumps(data), content_type='application/json')
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(self.url('ballots'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'Authentication required'})
+
+    def test_eligible_ballots(self):
+        Ballot.objects.create(ballot_title="Elsewhere", district="Other", pub_date=timezone.now())
+        Ballot.objects.create(ballot_title="Closed", district="BaltimoreCounty",
+                              pub_date=timezone.now() - datetime.timedelta(days=2),
+                              due_date=timezone.now() - datetime.timedelta(days=1))
+        voted = Ballot.objects.create(ballot_title="Voted", district="BaltimoreCounty", pub_date=timezone.now())
+        VoteRecord.objects.create(assoc_ballot=voted, voter_signature=blinded_signature(self.user.profile))
+        response = self.client.get(self.url('ballots'))
+        self.assertEqual([ballot['id'] for ballot in response.json()['ballots']], [self.ballot.pk])
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url('ballot'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(self.url('ballot'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        Choice.objects.create(choice_text="C", question=self.question)
+        response = self.client.get(self.url('ballot'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_definition(self):
+        payload = self.client.get(self.url('ballot')).json()
+        self.assertEqual(payload['title'], "Test")
+        self.assertEqual(payload['questions'], [{'id': self.question.pk, 'text': "Q1", 'choices': [
+            {'id': self.choice.pk, 'text': "A"}, {'id': self.other_choice.pk, 'text': "B"}]}])
+
+    def test_definition_queries(self):
+        self.client.get(self.url('ballots'))
+        with CaptureQueriesContext(connection) as api_queries:
+            self.client.get(self.url('ballot'))
+        with CaptureQueriesContext(connection) as html_queries:
+            self.client.get(reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk}))
+        self.assertLessEqual(len(api_queries), len(html_queries))
+
+    def test_definition_of_other_district(self):
+        ballot = Ballot.objects.create(ballot_title="Elsewhere", district="Other", pub_date=timezone.now())
+        self.assertEqual(self.client.get(self.url('ballot', ballot)).status_code, 403)
+        self.assertEqual(self.client.get(reverse('api-v1:ballot', kwargs={'ballot_id': 999})).status_code, 404)
+
+    def test_vote(self):
+        response = self.post_vote([(self.question, self.choice)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CastVote.objects.get().choice, self.choice)
+        self.assertEqual(votes_cast(self.ballot), 1)
+
+        response = self.post_vote([(self.question, self.other_choice)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(votes_cast(self.ballot), 1)
+
+    def test_vote_retry(self):
+        self.assertEqual(self.post_vote([(self.question, self.choice)], submission_key='key1').status_code, 201)
+        # the session, the user and the submission lookup
+        with self.assertNumQueries(3):
+            response = self.post_vote([(self.question, self.choice)], submission_key='key1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(votes_cast(self.ballot), 1)
+
+    def test_invalid_vote(self):
+        other = Question.objects.create(question_text="Q2", ballot=self.ballot)
+        self.assertEqual(self.post_vote([(other, self.choice)]).status_code, 400)
+        self.assertEqual(self.post_vote([]).status_code, 400)
+        response = self.client.post(self.url('vote'), 'choices', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url('vote')).status_code, 405)
+        self.assertFalse(VoteRecord.objects.exists())
+
+    def test_results(self):
+        self.assertEqual(self.client.get(self.url('results')).status_code, 403)
+        self.post_vote([(self.question, self.choice)])
+        Ballot.objects.filter(pk=self.ballot.pk).update(due_date=timezone.now())
+        self.client.logout()
+        payload = self.client.get(self.url('results')).json()
+        self.assertEqual(payload['votes_cast'], 1)
+        self.assertEqual([choice['votes'] for choice in payload['questions'][0]['choices']], [1, 0])
+
+    def test_tallied_results(self):
+        Ballot.objects.filter(pk=self.ballot.pk).update(due_date=timezone.now(), state=Ballot.TALLIED)
+        Choice.objects.filter(pk=self.choice.pk).update(votes=7)
+        payload = self.client.get(self.url('results')).json()
+        self.assertEqual([choice['votes'] for choice in payload['questions'][0]['choices']], [7, 0])
@@ -0,0 +1,99 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .archive import archivable_ballots, archive_ballot, iter_archived_cast_ballots, ArchiveChecksumError
+from .models import Ballot, Question, Choice, CastBallot, CastVote, BallotArchive, PackedCastBallot
+from .storage import pack_choice_ids
+
+
+class BallotArchiveTests(TestCase):
+    def setUp(self):
+        self.old_ballot = Ballot.objects.create(
+            ballot_title="Old",
+            district="BaltimoreCounty",
+            pub_date=timezone.now() - datetime.timedelta(days=400),
+            due_date=timezone.now() - datetime.timedelta(days=390)
+        )
+        self.question1 = Question.objects.create(question_text="Q1", ballot=self.old_ballot)
+        self.question2 = Question.objects.create(question_text="Q2", ballot=self.old_ballot)
+        self.choice_a = Choice.objects.create(choice_text="A", question=self.question1)
+        self.choice_b = Choice.objects.create(choice_text="B", question=self.question1)
+        self.choice_c = Choice.objects.create(choice_text="C", question=self.question2)
+        for selected in [[self.choice_a, self.choice_c], [self.choice_a], [self.choice_b, self.choice_c]]:
+            cast_ballot = CastBallot.objects.create(assoc_ballot=self.old_ballot)
+            for choice in selected:
+                CastVote.objects.create(choice=choice, ballot=cast_ballot)
+        self.recent_ballot = Ballot.objects.create(
+            ballot_title="Recent",
+            pub_date=timezone.now() - datetime.timedelta(days=20),
+            due_date=timezone.now() - datetime.timedelta(days=10)
+        )
+
+    def test_archivable_ballots(self):
+        """
+        only ballots past the archive horizon that have not been archived yet are archivable
+        """
+        self.assertEqual(list(archivable_ballots()), [self.old_ballot])
+        archive_ballot(self.old_ballot)
+        self.assertFalse(archivable_ballots().exists())
+
+    def test_archive_removes_raw_rows(self):
+        archive = archive_ballot(self.old_ballot)
+        self.assertEqual(archive.cast_ballot_count, 3)
+        self.assertFalse(CastBallot.objects.filter(assoc_ballot=self.old_ballot).exists())
+        self.assertFalse(CastVote.objects.filter(choice__question__ballot=self.old_ballot).exists())
+
+    def test_archive_freezes_tallies(self):
+        archive = archive_ballot(self.old_ballot)
+        self.assertEqual(archive.tallies, {str(self.choice_a.pk): 2, str(self.choice_b.pk): 1,
+                                           str(self.choice_c.pk): 2})
+        self.choice_a.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 2)
+
+    def test_archive_round_trip(self):
+        """
+        streaming an archive back out returns the same cast ballots that went in
+        """
+        archive = archive_ballot(self.old_ballot)
+        archive = BallotArchive.objects.get(pk=archive.pk)
+        rows = [sorted(choice_ids) for cast_id, choice_ids in iter_archived_cast_ballots(archive)]
+        self.assertEqual(sorted(rows), sorted([
+            sorted([self.choice_a.pk, self.choice_c.pk]),
+            [self.choice_a.pk],
+            sorted([self.choice_b.pk, self.choice_c.pk]),
+        ]))
+
+    def test_mixed_format_round_trip(self):
+        """
+        a ballot that switched storage format keeps every cast ballot apart, whatever the ids of its rows
+        """
+        row_ballot = CastBallot.objects.filter(assoc_ballot=self.old_ballot).order_by('id').first()
+        PackedCastBallot.objects.create(id=row_ballot.pk, assoc_ballot=self.old_ballot,
+                                        choices=pack_choice_ids([self.choice_b.pk]))
+        archive = archive_ballot(self.old_ballot)
+        self.assertEqual(archive.cast_ballot_count, 4)
+        rows = dict(iter_archived_cast_ballots(BallotArchive.objects.get(pk=archive.pk)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(sorted(rows[row_ballot.pk]), sorted([self.choice_a.pk, self.choice_c.pk]))
+        self.assertEqual(rows[-row_ballot.pk], [self.choice_b.pk])
+
+    def test_archive_checksum_mismatch(self):
+        archive = archive_ballot(self.old_ballot)
+        archive.checksum = '0' * 64
+        with self.assertRaises(ArchiveChecksumError):
+            list(iter_archived_cast_ballots(archive))
+
+    def test_archive_command(self):
+        out = StringIO()
+        call_command('archive_ballots', stdout=out)
+        self.assertIn('Old', out.getvalue())
+        self.assertTrue(BallotArchive.objects.filter(ballot=self.old_ballot).exists())
+        self.assertFalse(BallotArchive.objects.filter(ballot=self.recent_ballot).exists())
+
+        out = StringIO()
+        call_command('stream_archive', self.old_ballot.pk, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
@@ -569,4 +569,95 @@ class BallotDeleteTests(TestCase):
         url = reverse('ballots:delete', kwargs={'pk': self.ballot.pk})
         response = self.client.post(url)
         self.assertEqual(Ballot.objects.all().count(), 0)
-        self.assertEqual(response.status_code, 302)
\ No newline at end of file
+        self.assertEqual(response.status_code, 302)
+
+class ChoiceFormsetSaveTests(TestCase):
+    def setUp(self):
+        self.ballot = Ballot.objects.create(ballot_title="Test")
+        self.question = Question.objects.create(question_text="Test", ballot_id=self.ballot.id)
+        Choice.objects.bulk_create([Choice(question=self.question, choice_text='Choice %d' % i) for i in range(200)])
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+
+    def formset_data(self):
+        choices = list(self.question.choice_set.order_by('id'))
+        data = {'choice_set-TOTAL_FORMS': len(choices) + 3, 'choice_set-INITIAL_FORMS': len(choices),
+                'choice_set-MIN_NUM_FORMS': 0, 'choice_set-MAX_NUM_FORMS': 1000}
+        for i, choice in enumerate(choices):
+            data['choice_set-%d-id' % i] = choice.pk
+            data['choice_set-%d-question' % i] = self.question.pk
+            data['choice_set-%d-choice_text' % i] = choice.choice_text
+        return data, choices
+
+    def test_bulk_save(self):
+        """
+        edits, deletions and additions are applied with a handful of queries whatever the number of choices
+        """
+        data, choices = self.formset_data()
+        for i in range(0, 100):
+            data['choice_set-%d-choice_text' % i] = 'Edited %d' % i
+        for i in range(100, 150):
+            data['choice_set-%d-DELETE' % i] = 'on'
+        data['choice_set-200-choice_text'] = 'New'
+        url = reverse('ballots:choices', kwargs={'pk': self.question.pk})
+        with self.assertNumQueries(11):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, url)
+        texts = list(self.question.choice_set.order_by('id').values_list('choice_text', flat=True))
+        self.assertEqual(len(texts), 151)
+        self.assertEqual(texts[:100], ['Edited %d' % i for i in range(100)])
+        self.assertEqual(texts[100], 'Choice 150')
+        self.assertEqual(texts[-1], 'New')
+
+    def test_foreign_row_rejected(self):
+        other = Question.objects.create(question_text="Other", ballot_id=self.ballot.id)
+        other_choice = Choice.objects.create(question=other, choice_text='Other')
+        data, choices = self.formset_data()
+        data['choice_set-0-id'] = other_choice.pk
+        data['choice_set-0-choice_text'] = 'Hijacked'
+        response = self.client.post(reverse('ballots:choices', kwargs={'pk': self.question.pk}), data)
+        self.assertEqual(response.status_code, 200)
+        other_choice.refresh_from_db()
+        self.assertEqual(other_choice.choice_text, 'Other')
+
+
+class BallotListPagingTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # two ballots per due date so pages have to break ties on id
+        Ballot.objects.bulk_create([Ballot(ballot_title="Past %d" % i, pub_date=now - datetime.timedelta(days=100),
+                                           due_date=now - datetime.timedelta(days=1 + i // 2))
+                                    for i in range(30)])
+        for ballot in Ballot.objects.all()[:3]:
+            Question.objects.create(question_text="Q", ballot=ballot)
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+
+    def test_keyset_pages(self):
+        url = reverse('ballots:past')
+        # the session, the user and the page
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        first_page = response.context['ballots']
+        self.assertEqual(len(first_page), 24)
+        self.assertEqual([b.due_date for b in first_page], sorted([b.due_date for b in first_page], reverse=True))
+        response = self.client.get(url + '?' + response.context['next_page_query'])
+        second_page = response.context['ballots']
+        self.assertEqual(len(second_page), 6)
+        self.assertNotIn('next_page_query', response.context)
+        self.assertEqual(len({b.pk for b in first_page} | {b.pk for b in second_page}), 30)
+
+    def test_annotations(self):
+        response = self.client.get(reverse('ballots:past'))
+        counts = sorted(b.question_count for b in response.context['ballots'])
+        self.assertEqual(sum(counts), 3)
+        self.assertEqual(response.context['ballots'][0].votes_cast, 0)
+
+    def test_date_filter(self):
+        day = (timezone.now() - datetime.timedelta(days=3)).date()
+        response = self.client.get(reverse('ballots:past'), {'start': day.isoformat(), 'end': day.isoformat()})
+        self.assertEqual(len(response.context['ballots']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('ballots:past'), {'after': 'garbage'})
+        self.assertEqual(response.status_code, 404)
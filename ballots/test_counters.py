@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .counters import TURNOUT_SHARDS, record_vote, votes_cast, eligible_voters, rebuild_counters, with_turnout
+from .models import Ballot, Question, Choice, BallotTurnout, DistrictRoll
+from users.models import Profile
+
+
+class TurnoutCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(first_name='John', last_name='Smith', username='testuser',
+                                        password='password123', email='JohnSmith@fakemail.com')
+        profile = self.user.profile
+        profile.district = "BaltimoreCounty"
+        profile.save()
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.choice = Choice.objects.create(choice_text="A", question=self.question)
+
+    def test_district_roll_counts_profiles(self):
+        """
+        districts are counted case insensitively and follow profile changes
+        """
+        self.assertEqual(eligible_voters("baltimorecounty"), 1)
+        other = User.objects.create(username='other')
+        other.profile.district = "BALTIMORECOUNTY"
+        other.profile.save()
+        self.assertEqual(eligible_voters("BaltimoreCounty"), 2)
+
+        other.profile.district = "HowardCounty"
+        other.profile.save()
+        self.assertEqual(eligible_voters("BaltimoreCounty"), 1)
+        self.assertEqual(eligible_voters("HowardCounty"), 1)
+
+        other.delete()
+        self.assertEqual(eligible_voters("HowardCounty"), 0)
+
+    def test_deferred_district_change(self):
+        profile = Profile.objects.only('id', 'user').get(user=self.user)
+        profile.district = "HowardCounty"
+        profile.save()
+        self.assertEqual(eligible_voters("BaltimoreCounty"), 0)
+        self.assertEqual(eligible_voters("HowardCounty"), 1)
+
+    def test_vote_counts_turnout(self):
+        self.assertEqual(votes_cast(self.ballot), 0)
+        self.client.force_login(self.user)
+        self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                         {'question_%d' % self.question.pk: self.choice.pk})
+        self.assertEqual(votes_cast(self.ballot), 1)
+        # voting again is rejected and not counted
+        self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                         {'question_%d' % self.question.pk: self.choice.pk})
+        self.assertEqual(votes_cast(self.ballot), 1)
+
+    def test_sharded_turnout(self):
+        other = Ballot.objects.create(ballot_title="Other", district="BaltimoreCounty", pub_date=timezone.now())
+        for _ in range(50):
+            record_vote(self.ballot)
+        record_vote(other)
+        self.assertEqual(BallotTurnout.objects.filter(ballot=self.ballot).count(), TURNOUT_SHARDS)
+        self.assertGreater(BallotTurnout.objects.filter(ballot=self.ballot, votes_cast__gt=0).count(), 1)
+        self.assertEqual(votes_cast(self.ballot), 50)
+        self.assertEqual(dict(with_turnout(Ballot.objects.all()).values_list('id', 'votes_cast')),
+                         {self.ballot.pk: 50, other.pk: 1})
+
+    def test_rebuild(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                         {'question_%d' % self.question.pk: self.choice.pk})
+        BallotTurnout.objects.all().delete()
+        DistrictRoll.objects.update(eligible_voters=42)
+        rebuild_counters()
+        self.assertEqual(votes_cast(self.ballot), 1)
+        self.assertEqual(eligible_voters("BaltimoreCounty"), 1)
+
+    def test_published_list_shows_turnout(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(self.user)
+        self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                         {'question_%d' % self.question.pk: self.choice.pk})
+        self.client.force_login(admin)
+        response = self.client.get(reverse('ballots:published'))
+        ballot = response.context['ballots'][0]
+        self.assertEqual(ballot.votes_cast, 1)
+        self.assertEqual(ballot.eligible_voters, 1)
+        self.assertContains(response, 'Turnout: 1 of 1 voters')
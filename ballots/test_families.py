@@ -0,0 +1,89 @@
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .families import fan_out, family_results
+from .models import Ballot, BallotFamily, Choice
+from .storage import record_cast_ballot
+from .test_import import make_definition
+
+
+def make_family_definition(**overrides):
+    definition = make_definition(districts=['BaltimoreCounty', 'HowardCounty', 'CarrollCounty'])
+    definition.pop('district')
+    definition.update(overrides)
+    return definition
+
+
+class BallotFamilyTests(TestCase):
+    def test_fan_out(self):
+        with self.assertNumQueries(8):
+            family = fan_out(make_family_definition())
+        ballots = list(family.ballots.order_by('id'))
+        self.assertEqual([ballot.district for ballot in ballots], ['BaltimoreCounty', 'HowardCounty', 'CarrollCounty'])
+        self.assertEqual(family.definition[0], {'question_text': 'Q1', 'choices': ['A', 'B', 'C']})
+        for ballot in ballots:
+            self.assertEqual(ballot.ballot_title, 'Imported')
+            self.assertEqual(list(ballot.question_set.order_by('id').values_list('question_text', flat=True)),
+                             ['Q1', 'Q2'])
+            self.assertEqual(Choice.objects.filter(question__ballot=ballot).count(), 5)
+
+    def test_invalid_districts_create_nothing(self):
+        with self.assertRaises(ValidationError):
+            fan_out(make_family_definition(districts=[]))
+        with self.assertRaises(ValidationError):
+            fan_out(make_family_definition(districts=['BaltimoreCounty', 'baltimorecounty']))
+        with self.assertRaises(ValidationError):
+            fan_out(make_family_definition(districts=['BaltimoreCounty', 'x' * 201]))
+        self.assertFalse(BallotFamily.objects.exists())
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_family_results(self):
+        family = fan_out(make_family_definition())
+        for ballot, choice_text in zip(family.ballots.order_by('id'), ['A', 'A', 'B']):
+            choice = Choice.objects.get(question__ballot=ballot, choice_text=choice_text)
+            record_cast_ballot(ballot, [choice])
+        results, votes_cast = family_results(family)
+        self.assertEqual(results, [('Q1', [('A', 2), ('B', 1), ('C', 0)]), ('Q2', [('D', 0), ('E', 0)])])
+
+    def test_family_results_ignore_choice_texts(self):
+        family = fan_out(make_family_definition())
+        ballots = list(family.ballots.order_by('id'))
+        # one district renames a choice, another has two choices with the same text
+        Choice.objects.filter(question__ballot=ballots[0], choice_text='A').update(choice_text='Option A')
+        Choice.objects.filter(question__ballot=ballots[1], choice_text='C').update(choice_text='B')
+        Choice.objects.create(question=ballots[2].question_set.order_by('id')[0], choice_text='A')
+        for ballot, choice_text in zip(ballots, ['Option A', 'B', 'A']):
+            record_cast_ballot(ballot, Choice.objects.filter(question__ballot=ballot, choice_text=choice_text)
+                               .order_by('id')[:1])
+        results, votes_cast = family_results(family)
+        self.assertEqual(results[0], ('Q1', [('A', 2), ('B', 1), ('C', 0)]))
+
+    def test_import_dispatches_on_districts(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('ballots:import'), json.dumps(make_family_definition()),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        family = BallotFamily.objects.get(pk=response.json()['family'])
+        self.assertEqual(response.json()['ballots'], list(family.ballots.order_by('id').values_list('id', flat=True)))
+
+    def test_family_results_view(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        family = fan_out(make_family_definition())
+        response = self.client.get(reverse('ballots:family-results', kwargs={'pk': family.pk}))
+        self.assertContains(response, 'HowardCounty')
+        self.assertContains(response, 'available once voting closes')
+
+        past = timezone.now() - datetime.timedelta(days=1)
+        BallotFamily.objects.filter(pk=family.pk).update(due_date=past)
+        family.ballots.update(due_date=past)
+        response = self.client.get(reverse('ballots:family-results', kwargs={'pk': family.pk}))
+        self.assertContains(response, 'Combined results')
+        self.assertEqual(response.context['results'][0][0], 'Q1')
@@ -0,0 +1,117 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .importer import import_ballot, parse_definition
+from .models import Ballot, Question, Choice
+
+
+def make_definition(**overrides):
+    definition = {
+        'ballot_title': 'Imported',
+        'ballot_description': 'From a file',
+        'pub_date': (timezone.now() + datetime.timedelta(days=1)).isoformat(),
+        'due_date': (timezone.now() + datetime.timedelta(days=30)).isoformat(),
+        'district': 'BaltimoreCounty',
+        'questions': [
+            {'question_text': 'Q1', 'choices': ['A', 'B', 'C']},
+            {'question_text': 'Q2', 'choices': ['D', 'E']},
+        ],
+    }
+    definition.update(overrides)
+    return definition
+
+
+class BallotImportTests(TestCase):
+    def test_import_ballot(self):
+        with self.assertNumQueries(6):
+            ballot = import_ballot(make_definition())
+        self.assertEqual(ballot.ballot_title, 'Imported')
+        self.assertEqual(list(ballot.question_set.order_by('id').values_list('question_text', flat=True)),
+                         ['Q1', 'Q2'])
+        q1 = ballot.question_set.get(question_text='Q1')
+        self.assertEqual(list(q1.choice_set.order_by('id').values_list('choice_text', flat=True)), ['A', 'B', 'C'])
+        self.assertEqual(Choice.objects.filter(question__ballot=ballot).count(), 5)
+
+    def test_same_rules_as_add_ballot_form(self):
+        """
+        publication must be in the future and before the due date
+        """
+        with self.assertRaises(ValidationError):
+            import_ballot(make_definition(pub_date=(timezone.now() - datetime.timedelta(days=1)).isoformat()))
+        with self.assertRaises(ValidationError):
+            import_ballot(make_definition(pub_date=(timezone.now() + datetime.timedelta(days=31)).isoformat()))
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_invalid_questions_create_nothing(self):
+        with self.assertRaises(ValidationError) as cm:
+            import_ballot(make_definition(questions=[{'question_text': 'Q1', 'choices': ['A', 'x' * 201]}]))
+        self.assertIn('question 1 choice 2', cm.exception.messages[0])
+        self.assertFalse(Ballot.objects.exists())
+        self.assertFalse(Question.objects.exists())
+
+    def test_parse_yaml(self):
+        definition = parse_definition('ballot_title: Imported\nquestions:\n  - question_text: Q1\n'
+                                      '    choices: [A, B]\n', 'yaml')
+        self.assertEqual(definition['questions'][0]['choices'], ['A', 'B'])
+        with self.assertRaises(ValidationError):
+            parse_definition('[1, 2]')
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as definition_file:
+            json.dump(make_definition(), definition_file)
+        try:
+            out = StringIO()
+            call_command('import_ballot', definition_file.name, stdout=out)
+            self.assertIn('with 2 questions', out.getvalue())
+        finally:
+            os.remove(definition_file.name)
+        with self.assertRaises(CommandError):
+            call_command('import_ballot', '/does/not/exist.json')
+
+
+class ImportBallotViewTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+
+    def test_import_non_staff_redirect(self):
+        user = User.objects.create(username='testuser')
+        self.client.force_login(user)
+        response = self.client.get(reverse('ballots:import'))
+        self.assertRedirects(response, '/')
+
+    def test_import_upload(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('ballot.json', json.dumps(make_definition()).encode())
+        response = self.client.post(reverse('ballots:import'), {'definition_file': upload, 'format': 'json'})
+        ballot = Ballot.objects.get()
+        self.assertRedirects(response, reverse('ballots:ballot-detail', kwargs={'pk': ballot.pk}))
+
+    def test_import_form_errors(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('ballots:import'), {'definition': '{}', 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+
+    def test_import_json_body(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('ballots:import'), json.dumps(make_definition()),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], Ballot.objects.get().pk)
+
+        response = self.client.post(reverse('ballots:import'), json.dumps(make_definition(ballot_title='')),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['errors'])
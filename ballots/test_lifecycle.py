@@ -0,0 +1,128 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .lifecycle import run_lifecycle, tally_ballot, next_transition, ballot_tallied, TALLY_GRACE
+from .models import Ballot, Question, Choice
+from .storage import record_cast_ballot
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        if not self.fail_silently:
+            raise ConnectionError('refused')
+        return 0
+
+
+class BallotLifecycleTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.draft = Ballot.objects.create(ballot_title="Draft", pub_date=now + datetime.timedelta(days=1),
+                                           due_date=now + datetime.timedelta(days=2))
+        self.open = Ballot.objects.create(ballot_title="Open", pub_date=now - datetime.timedelta(days=1),
+                                          due_date=now + datetime.timedelta(hours=1))
+        self.ended = Ballot.objects.create(ballot_title="Ended", pub_date=now - datetime.timedelta(days=2),
+                                           due_date=now - datetime.timedelta(days=1))
+        question = Question.objects.create(question_text="Q1", ballot=self.ended)
+        self.choice_a = Choice.objects.create(choice_text="A", question=question)
+        self.choice_b = Choice.objects.create(choice_text="B", question=question)
+        for choice in [self.choice_a, self.choice_a, self.choice_b]:
+            record_cast_ballot(self.ended, [choice])
+
+    def state(self, ballot):
+        return Ballot.objects.values_list('state', flat=True).get(pk=ballot.pk)
+
+    def test_run_lifecycle(self):
+        done = run_lifecycle()
+        self.assertEqual(done, {Ballot.PUBLISHED: 1, Ballot.CLOSED: 1, Ballot.TALLIED: 1, Ballot.ARCHIVED: 0})
+        self.assertEqual(self.state(self.draft), Ballot.DRAFT)
+        self.assertEqual(self.state(self.open), Ballot.PUBLISHED)
+        self.assertEqual(self.state(self.ended), Ballot.TALLIED)
+        self.choice_a.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 2)
+
+        # a second run has nothing left to do
+        done = run_lifecycle()
+        self.assertEqual(sum(done.values()), 0)
+
+    def test_tally_once(self):
+        tallied = []
+        ballot_tallied.connect(lambda sender, ballot, counts, **kwargs: tallied.append(ballot.pk), weak=False,
+                               dispatch_uid='test_tally_once')
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                run_lifecycle()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertIsNone(tally_ballot(self.ended))
+        finally:
+            ballot_tallied.disconnect(dispatch_uid='test_tally_once')
+        self.assertEqual(tallied, [self.ended.pk])
+
+    def test_tally_notifies_on_commit(self):
+        tallied = []
+        ballot_tallied.connect(lambda sender, ballot, counts, **kwargs: tallied.append(counts), weak=False,
+                               dispatch_uid='test_tally_notifies')
+        try:
+            Ballot.objects.filter(pk=self.ended.pk).update(state=Ballot.CLOSED)
+            with self.captureOnCommitCallbacks(execute=True):
+                tally_ballot(self.ended)
+        finally:
+            ballot_tallied.disconnect(dispatch_uid='test_tally_notifies')
+        self.assertEqual(tallied, [{self.choice_a.pk: 2, self.choice_b.pk: 1}])
+
+    def test_archive_after_horizon(self):
+        Ballot.objects.filter(pk=self.ended.pk).update(due_date=timezone.now() - datetime.timedelta(days=400))
+        done = run_lifecycle()
+        self.assertEqual(done[Ballot.ARCHIVED], 1)
+        self.assertEqual(self.state(self.ended), Ballot.ARCHIVED)
+
+    def test_next_transition(self):
+        self.assertEqual(next_transition(), self.open.due_date)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('run_lifecycle', stdout=out)
+        self.assertIn('1 ballot(s) tallied', out.getvalue())
+
+    def test_tally_waits_for_late_votes(self):
+        just_closed = timezone.now() - datetime.timedelta(seconds=10)
+        Ballot.objects.filter(pk=self.ended.pk).update(due_date=just_closed)
+        done = run_lifecycle()
+        self.assertEqual(done[Ballot.TALLIED], 0)
+        self.assertEqual(self.state(self.ended), Ballot.CLOSED)
+        self.assertIsNone(tally_ballot(self.ended))
+        self.assertEqual(next_transition(), just_closed + TALLY_GRACE)
+
+        # a vote committing after due_date is still counted
+        record_cast_ballot(self.ended, [self.choice_b])
+        done = run_lifecycle(now=timezone.now() + TALLY_GRACE)
+        self.assertEqual(done[Ballot.TALLIED], 1)
+        self.choice_b.refresh_from_db()
+        self.assertEqual(self.choice_b.votes, 2)
+
+    @override_settings(ADMINS=[('Admin', 'admin@example.com')])
+    def test_tally_emails_admins(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            run_lifecycle()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Results of Ended', mail.outbox[0].subject)
+        self.assertIn('A: 2', mail.outbox[0].body)
+        self.assertIn('B: 1', mail.outbox[0].body)
+
+    @override_settings(ADMINS=[('Admin', 'admin@example.com')],
+                       EMAIL_BACKEND='ballots.test_lifecycle.FailingBackend')
+    def test_email_failure_keeps_tallying(self):
+        later = Ballot.objects.create(ballot_title="Later", pub_date=timezone.now() - datetime.timedelta(days=2),
+                                      due_date=timezone.now() - datetime.timedelta(hours=1))
+        with self.assertLogs('ballots.lifecycle', 'ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                done = run_lifecycle()
+        self.assertEqual(done[Ballot.TALLIED], 2)
+        self.assertEqual(self.state(later), Ballot.TALLIED)
+        self.assertIn('email_results failed', logs.output[0])
+        self.assertEqual(len(logs.output), 2)
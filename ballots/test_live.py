@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .live import LiveResultsRouter, LocalBroker, broker
+from .models import Ballot, Question, Choice
+
+
+class LocalBrokerTests(TestCase):
+    def test_publish_reaches_subscribers_of_ballot(self):
+        local_broker = LocalBroker()
+
+        async def run():
+            first = local_broker.subscribe(1)
+            other = local_broker.subscribe(2)
+            local_broker.publish(1, 'turnout', {'votes_cast': 1})
+            message = await asyncio.wait_for(first[1].get(), 1)
+            self.assertTrue(other[1].empty())
+            local_broker.unsubscribe(1, first)
+            local_broker.unsubscribe(2, other)
+            return message
+
+        self.assertEqual(async_to_sync(run)(), ('turnout', {'votes_cast': 1}))
+        self.assertEqual(local_broker.subscriber_count(1), 0)
+
+
+class LiveResultsTests(TestCase):
+    def setUp(self):
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.choice = Choice.objects.create(choice_text="A", question=self.question)
+        self.admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+
+    def stream(self, path, extra_event=None):
+        """
+        runs the ASGI app until it has sent the snapshot and one more event, then disconnects
+        """
+        async def django_app(scope, receive, send):
+            raise AssertionError('live requests should not reach Django')
+
+        app = LiveResultsRouter(django_app)
+        cookie = 'sessionid=%s' % self.client.cookies['sessionid'].value if 'sessionid' in self.client.cookies else ''
+        scope = {'type': 'http', 'path': path, 'headers': [(b'cookie', cookie.encode())]}
+        sent = []
+
+        async def run():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                bodies = [m for m in sent if m['type'] == 'http.response.body']
+                if extra_event and len(bodies) == 1:
+                    broker.publish(self.ballot.pk, *extra_event)
+                elif len(bodies) >= 2 or not message.get('more_body', False):
+                    disconnect.set()
+
+            await asyncio.wait_for(app(scope, receive, send), 5)
+
+        async_to_sync(run)()
+        return sent
+
+    def test_anonymous_forbidden(self):
+        sent = self.stream('/ballot-admin/%d/live' % self.ballot.pk)
+        self.assertEqual(sent[0]['status'], 403)
+
+    def test_turnout_stream(self):
+        self.client.force_login(self.admin)
+        sent = self.stream('/ballot-admin/%d/live' % self.ballot.pk, ('turnout', {'votes_cast': 7}))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertTrue(sent[1]['body'].startswith(b'event: turnout\ndata: '))
+        self.assertEqual(sent[2]['body'], b'event: turnout\ndata: {"votes_cast": 7}\n\n')
+        self.assertEqual(broker.subscriber_count(self.ballot.pk), 0)
+
+    def test_closed_ballot_sends_tally(self):
+        self.ballot.due_date = timezone.now() - datetime.timedelta(seconds=1)
+        self.ballot.save()
+        self.client.force_login(self.admin)
+        sent = self.stream('/ballot-admin/%d/live' % self.ballot.pk)
+        self.assertTrue(sent[2]['body'].startswith(b'event: tally\ndata: '))
+
+    def test_missing_ballot(self):
+        self.client.force_login(self.admin)
+        sent = self.stream('/ballot-admin/0/live')
+        self.assertEqual(sent[0]['status'], 404)
+
+    def test_vote_publishes_turnout(self):
+        """
+        a committed vote publishes the ballot's new turnout to subscribers
+        """
+        voter = User.objects.create(username='voter')
+        voter.profile.district = "BaltimoreCounty"
+        voter.profile.save()
+        self.client.force_login(voter)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                             {'question_%d' % self.question.pk: self.choice.pk})
+
+        async def listen():
+            subscriber = broker.subscribe(self.ballot.pk)
+            try:
+                await sync_to_async(lambda: [callback() for callback in callbacks])()
+                return await asyncio.wait_for(subscriber[1].get(), 1)
+            finally:
+                broker.unsubscribe(self.ballot.pk, subscriber)
+
+        event, data = async_to_sync(listen)()
+        self.assertEqual(event, 'turnout')
+        self.assertEqual(data['votes_cast'], 1)
+
+    def test_page_subscribes_under_asgi_only(self):
+        self.client.force_login(self.admin)
+        url = reverse('ballots:ballot-detail', kwargs={'pk': self.ballot.pk})
+        self.assertNotContains(self.client.get(url), 'EventSource')
+
+        async_client = AsyncClient()
+        async_client.cookies = self.client.cookies
+
+        async def fetch():
+            return await async_client.get(url)
+
+        response = async_to_sync(fetch)()
+        self.assertContains(response, 'EventSource')
+        self.assertContains(response, 'addEventListener("tally"')
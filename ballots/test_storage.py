@@ -0,0 +1,88 @@
+import datetime
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Ballot, Question, Choice, CastBallot, CastVote, PackedCastBallot
+from .storage import pack_choice_ids, unpack_choice_ids, record_cast_ballot, iter_cast_ballots, choice_counts, \
+    pack_cast_ballots
+
+
+class CastStorageTests(TestCase):
+    def setUp(self):
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question1 = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.question2 = Question.objects.create(question_text="Q2", ballot=self.ballot)
+        self.choice_a = Choice.objects.create(choice_text="A", question=self.question1)
+        self.choice_b = Choice.objects.create(choice_text="B", question=self.question1)
+        self.choice_c = Choice.objects.create(choice_text="C", question=self.question2)
+
+    def test_pack_round_trip(self):
+        packed = pack_choice_ids([9, 3, 2 ** 40])
+        self.assertEqual(len(packed), 24)
+        self.assertEqual(unpack_choice_ids(packed), [3, 9, 2 ** 40])
+
+    def test_record_rows(self):
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        self.assertEqual(CastBallot.objects.filter(assoc_ballot=self.ballot).count(), 1)
+        self.assertEqual(CastVote.objects.filter(ballot__assoc_ballot=self.ballot).count(), 2)
+        self.assertFalse(PackedCastBallot.objects.exists())
+
+    @override_settings(BALLOTS_CAST_STORAGE='packed')
+    def test_record_packed(self):
+        """
+        packed storage writes a single row per cast ballot
+        """
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        self.assertFalse(CastBallot.objects.exists())
+        self.assertEqual(PackedCastBallot.objects.filter(assoc_ballot=self.ballot).count(), 1)
+
+    def test_counts_across_formats(self):
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        with self.settings(BALLOTS_CAST_STORAGE='packed'):
+            record_cast_ballot(self.ballot, [self.choice_a])
+            record_cast_ballot(self.ballot, [self.choice_b, self.choice_c])
+        counts = choice_counts(self.ballot)
+        self.assertEqual(counts[self.choice_a.pk], 2)
+        self.assertEqual(counts[self.choice_b.pk], 1)
+        self.assertEqual(counts[self.choice_c.pk], 2)
+        self.assertEqual(len(list(iter_cast_ballots(self.ballot))), 3)
+
+    def test_pack_existing_rows(self):
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        record_cast_ballot(self.ballot, [self.choice_b])
+        before = choice_counts(self.ballot)
+        self.assertEqual(pack_cast_ballots(self.ballot), 2)
+        self.assertFalse(CastVote.objects.exists())
+        self.assertFalse(CastBallot.objects.exists())
+        self.assertEqual(choice_counts(self.ballot), before)
+
+    def test_pack_in_batches(self):
+        for _ in range(5):
+            record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        record_cast_ballot(self.ballot, [self.choice_b])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(pack_cast_ballots(self.ballot, batch_size=2), 6)
+        # one insert per batch
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 3)
+        self.assertEqual(choice_counts(self.ballot), {self.choice_a.pk: 5, self.choice_b.pk: 1, self.choice_c.pk: 5})
+
+    @override_settings(BALLOTS_CAST_STORAGE='packed')
+    def test_packed_results(self):
+        """
+        results tallies votes stored in the packed format
+        """
+        user = User.objects.create(username='voter')
+        user.profile.district = "BaltimoreCounty"
+        user.profile.save()
+        self.client.force_login(user)
+        self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
+                         {'question_%d' % self.question1.pk: self.choice_b.pk})
+        self.ballot.due_date = timezone.now() - datetime.timedelta(seconds=1)
+        self.ballot.save()
+        self.client.get(reverse('ballots:results', kwargs={'ballot_id': self.ballot.pk}))
+        self.choice_b.refresh_from_db()
+        self.assertEqual(self.choice_b.votes, 1)
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Ballot, Question, Choice
+from .storage import record_cast_ballot
+from .tally import compute_tally
+
+
+class TallyTests(TestCase):
+    def setUp(self):
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question1 = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.question2 = Question.objects.create(question_text="Q2", ballot=self.ballot)
+        self.choice_a = Choice.objects.create(choice_text="A", question=self.question1)
+        self.choice_b = Choice.objects.create(choice_text="B", question=self.question1)
+        self.choice_c = Choice.objects.create(choice_text="C", question=self.question2)
+        self.choice_d = Choice.objects.create(choice_text="D", question=self.question2)
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+        record_cast_ballot(self.ballot, [self.choice_a, self.choice_d])
+        record_cast_ballot(self.ballot, [self.choice_b])
+        with self.settings(BALLOTS_CAST_STORAGE='packed'):
+            record_cast_ballot(self.ballot, [self.choice_a, self.choice_c])
+            record_cast_ballot(self.ballot, [self.choice_d])
+
+    def test_choice_counts(self):
+        tally = compute_tally(self.ballot, chunk_size=2)
+        self.assertEqual(tally.choice_counts(), {self.choice_a.pk: 3, self.choice_b.pk: 1,
+                                                 self.choice_c.pk: 2, self.choice_d.pk: 2})
+        self.assertEqual(tally.cast_ballots, 5)
+
+    def test_question_turnout(self):
+        tally = compute_tally(self.ballot)
+        self.assertEqual(tally.question_turnout(), {self.question1.pk: 4, self.question2.pk: 4})
+
+    def test_crosstab(self):
+        """
+        only cast ballots answering both questions appear in the cross tabulation
+        """
+        tally = compute_tally(self.ballot, crosstabs=[(self.question1.pk, self.question2.pk)], chunk_size=3)
+        rows, cols, matrix = tally.crosstab(self.question1.pk, self.question2.pk)
+        self.assertEqual(rows, [self.choice_a.pk, self.choice_b.pk])
+        self.assertEqual(cols, [self.choice_c.pk, self.choice_d.pk])
+        self.assertEqual(matrix.tolist(), [[2, 1], [0, 0]])
+
+    def test_empty_ballot(self):
+        ballot = Ballot.objects.create(ballot_title="Empty", pub_date=timezone.now())
+        tally = compute_tally(ballot)
+        self.assertEqual(tally.choice_counts(), {})
+        self.assertEqual(tally.cast_ballots, 0)
+
+    def test_tally_command(self):
+        out = StringIO()
+        call_command('tally_ballot', self.ballot.pk, '--crosstab', self.question1.pk, self.question2.pk,
+                     '--save', '--benchmark', '--repeat', '1', stdout=out)
+        self.assertIn('5 cast ballots', out.getvalue())
+        self.assertIn('numpy', out.getvalue())
+        self.choice_a.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 3)
+
+    def test_results_crosstab(self):
+        """
+        results cross tabulates two questions when asked to
+        """
+        self.ballot.due_date = timezone.now()
+        self.ballot.save()
+        response = self.client.get(reverse('ballots:results', kwargs={'ballot_id': self.ballot.pk}),
+                                   {'crosstab': '%s,%s' % (self.question1.pk, self.question2.pk)})
+        self.assertEqual(response.context['crosstab']['columns'], ['C', 'D'])
+        self.assertEqual(response.context['crosstab']['rows'], [('A', [2, 1]), ('B', [0, 0])])
+
+        response = self.client.get(reverse('ballots:results', kwargs={'ballot_id': self.ballot.pk}))
+        self.assertIsNone(response.context['crosstab'])
+        self.choice_a.refresh_from_db()
+        self.assertEqual(self.choice_a.votes, 3)
@@ -1,11 +1,14 @@
 import datetime
 from django.contrib.auth.models import User
 from django.core.signing import Signer
+from django.db import IntegrityError, connection
 from django.test import Client, TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import Ballot, Question, Choice, VoteRecord, CastBallot, CastVote
+from .counters import votes_cast
+from .models import Ballot, Question, Choice, VoteRecord, CastBallot, CastVote, VoteSubmission
 from users.models import Profile
 
 class IndexTests(TestCase):
@@ -309,7 +312,7 @@ class VoteViewTests(TestCase):
 
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk}),
-                                     {self.question.question_text: self.choice.pk})
+                                     {'question_%d' % self.question.pk: self.choice.pk})
 
         vote_records = VoteRecord.objects.all()
         #Should create vote record
@@ -360,7 +363,7 @@ class VoteViewTests(TestCase):
         choice1.save()
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id':wrong_ballot.pk}),
-                                    {question1.question_text: choice1.pk})
+                                    {'question_%d' % question1.pk: choice1.pk})
 
         vote_records = VoteRecord.objects.all()
         # Should not create vote record
@@ -384,7 +387,7 @@ class VoteViewTests(TestCase):
         choice1.save()
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id': wrong_ballot.pk}),
-                                    {question1.question_text: choice1.pk})
+                                    {'question_%d' % question1.pk: choice1.pk})
 
         vote_records = VoteRecord.objects.all()
         # Should not create vote record
@@ -407,7 +410,7 @@ class VoteViewTests(TestCase):
         choice1.save()
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id': wrong_ballot.pk}),
-                                    {question1.question_text: choice1.pk})
+                                    {'question_%d' % question1.pk: choice1.pk})
 
         vote_records = VoteRecord.objects.all()
         # Should not create vote record
@@ -432,7 +435,7 @@ class VoteViewTests(TestCase):
         choice1.save()
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id': wrong_ballot.pk}),
-                                    {question1.question_text: choice1.pk})
+                                    {'question_%d' % question1.pk: choice1.pk})
 
         vote_records = VoteRecord.objects.all()
         # Should already exist
@@ -457,7 +460,7 @@ class VoteViewTests(TestCase):
         choice1.save()
         self.client.force_login(self.user)
         response = self.client.post(reverse('ballots:vote', kwargs={'ballot_id': wrong_ballot.pk}),
-                                    {question1.question_text: choice1.pk})
+                                    {'question_%d' % question1.pk: choice1.pk})
 
         vote_records = VoteRecord.objects.filter(voter_signature=self.sign).filter(assoc_ballot=wrong_ballot)
         # Should create a new vote record
@@ -470,3 +473,102 @@ class VoteViewTests(TestCase):
         cast_votes = CastVote.objects.filter(choice=choice1)
         # should not create a cast vote
         self.assertTrue(cast_votes.exists())
+
+
+class IdempotentVoteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.choice = Choice.objects.create(choice_text="A", question=self.question)
+        self.sign = Signer().sign(self.user.profile.sign)[51:]
+        self.url = reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk})
+        self.client.force_login(self.user)
+
+    def test_form_has_submission_key(self):
+        response = self.client.get(reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk}))
+        key = response.context['submission_key']
+        self.assertContains(response, 'name="submission_key" value="%s"' % key)
+        self.assertNotEqual(self.client.get(reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk}))
+                            .context['submission_key'], key)
+
+    def test_resubmission_is_a_lookup(self):
+        data = {'submission_key': 'key1', 'question_%d' % self.question.pk: self.choice.pk}
+        response = self.client.post(self.url, data)
+        self.assertRedirects(response, reverse('ballots:index'), fetch_redirect_response=False)
+        self.assertTrue(VoteSubmission.objects.filter(key='key1', voter_signature=self.sign).exists())
+
+        # the session, the user and the submission lookup
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, data)
+        self.assertRedirects(response, reverse('ballots:index'), fetch_redirect_response=False)
+        self.assertEqual(VoteRecord.objects.count(), 1)
+        self.assertEqual(CastBallot.objects.count(), 1)
+        self.assertEqual(votes_cast(self.ballot), 1)
+
+    def test_concurrent_submission_not_counted(self):
+        # another request holds the key, as if it was inserted between the lookup and the vote
+        VoteSubmission.objects.create(key='key1', assoc_ballot=self.ballot, voter_signature='other')
+        response = self.client.post(self.url, {'submission_key': 'key1', 'question_%d' % self.question.pk: self.choice.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(VoteRecord.objects.filter(voter_signature=self.sign).exists())
+        self.assertFalse(CastBallot.objects.exists())
+        self.assertEqual(votes_cast(self.ballot), 0)
+
+    def test_one_vote_record_per_voter(self):
+        VoteRecord.objects.create(assoc_ballot=self.ballot, voter_signature=self.sign)
+        with self.assertRaises(IntegrityError):
+            VoteRecord.objects.create(assoc_ballot=self.ballot, voter_signature=self.sign)
+
+
+class VoteFormTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.questions = [Question.objects.create(question_text="Q%d" % i, ballot=self.ballot) for i in range(3)]
+        self.choices = [Choice.objects.create(choice_text="A", question=question) for question in self.questions]
+        self.url = reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk})
+        self.client.force_login(self.user)
+
+    def test_form_uses_question_ids(self):
+        response = self.client.get(reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk}))
+        self.assertContains(response, 'name="question_%d"' % self.questions[0].pk)
+        self.assertNotContains(response, 'name="Q0"')
+
+    def vote_queries(self, username, questions):
+        voter = User.objects.create(username=username)
+        voter.profile.district = "BaltimoreCounty"
+        voter.profile.save()
+        self.client.force_login(voter)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'question_%d' % question.pk: choice.pk
+                                        for question, choice in zip(self.questions[:questions], self.choices)})
+        return len(queries)
+
+    def test_choices_checked_in_one_query(self):
+        # the first vote also creates the ballot's turnout counter
+        self.vote_queries('voter1', 1)
+        # then the same queries for any number of questions
+        self.assertEqual(self.vote_queries('voter2', 3), self.vote_queries('voter3', 1))
+        self.assertEqual(CastVote.objects.count(), 5)
+
+    def test_choice_of_other_question_rejected(self):
+        response = self.client.post(self.url, {'question_%d' % self.questions[0].pk: self.choices[1].pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VoteRecord.objects.exists())
+
+    def test_choice_of_other_ballot_rejected(self):
+        ballot = Ballot.objects.create(ballot_title="Other", district="BaltimoreCounty", pub_date=timezone.now())
+        choice = Choice.objects.create(choice_text="B", question=Question.objects.create(question_text="Q", ballot=ballot))
+        response = self.client.post(self.url, {'question_%d' % choice.question_id: choice.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VoteRecord.objects.exists())
+
+    def test_malformed_choice_rejected(self):
+        response = self.client.post(self.url, {'question_%d' % self.questions[0].pk: 'A'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VoteRecord.objects.exists())
@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import AddBallotView, ArchivedBallotsView, BallotEditView, BallotAdminView, PublishedBallotsView, \
-    AddQuestionView, AddChoiceView, BallotDeleteView
+    AddQuestionView, AddChoiceView, BallotDeleteView, ImportBallotView, FamilyResultsView
 from .views import BallotDetailView, PastBallotsView
 from . import views
 
@@ -15,6 +15,8 @@ urlpatterns = [
     path('ballot-admin/past', PastBallotsView.as_view(), name='past'),
     path('ballot-admin/archived', ArchivedBallotsView.as_view(), name='archived'),
     path('add/', AddBallotView.as_view(), name='add'),
+    path('import/', ImportBallotView.as_view(), name='import'),
+    path('family/<int:pk>/', FamilyResultsView.as_view(), name='family-results'),
     path('<int:pk>/edit', BallotEditView.as_view(), name='edit'),
     path('<int:pk>/detail', BallotDetailView.as_view(), name='ballot-detail'),
     path('<int:pk>/questions/', AddQuestionView.as_view(), name='questions'),
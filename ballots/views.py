@@ -1,40 +1,48 @@
 import datetime
 
 from django.contrib.auth.views import redirect_to_login
-from django.core.signing import Signer
+from django.core.handlers.asgi import ASGIRequest
 from django.template import loader
-from django.http import HttpResponse, HttpResponseRedirect, Http404
-from django.shortcuts import get_list_or_404, render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django.views.generic import UpdateView, CreateView, ListView, FormView, DeleteView
 from django.views.generic.detail import SingleObjectMixin, DetailView
-from .forms import AddBallotForm, BallotQuestionFormset, QuestionChoiceFormset
+from .forms import AddBallotForm, BallotQuestionFormset, QuestionChoiceFormset, ImportBallotForm
 
 # Create your views here.
 
-from ballots.models import Ballot, Question, Choice, CastVote, VoteRecord, CastBallot
+from ballots.models import Ballot, Question, Choice, CastVote, VoteRecord, CastBallot, BallotFamily
+from ballots.archive import archive_cutoff
+from ballots.storage import choice_counts
+from ballots.counters import with_turnout
+from ballots.live import publish_tally
+from ballots.importer import parse_definition, import_ballot
+from ballots.families import fan_out, family_results
+from ballots.listing import KeysetListMixin
+from ballots.voting import can_vote, cast_vote, clean_submission_key, form_choices, has_voted, selected_choices, \
+    was_submitted
 
 
 def index(request):
     if not request.user.is_authenticated:
         return redirect('/users/login/')
-    signer = Signer()
-    sign = signer.sign(request.user.profile.sign)
-    sign = sign[51:]
+    sign = request.voter.signature
     today = timezone.now()
     vote_records = VoteRecord.objects.filter(voter_signature__exact=sign)
     finished_ballot_ids = []
     for record in vote_records:
         finished_ballot_ids.append(record.assoc_ballot.id)
-    ballot_list = Ballot.objects.filter(pub_date__lte=today).filter(district__iexact=request.user.profile.district) \
+    ballot_list = Ballot.objects.filter(pub_date__lte=today).filter(district__iexact=request.voter.district) \
         .exclude(id__in=finished_ballot_ids).order_by('due_date')
-    finished_ballots = Ballot.objects.filter(pub_date__lte=today).filter(district__iexact=request.user.profile.district)\
+    finished_ballots = Ballot.objects.filter(pub_date__lte=today).filter(district__iexact=request.voter.district)\
         .filter(id__in=finished_ballot_ids).filter(due_date__gte=today).order_by('due_date')
-    old_ballots = Ballot.objects.filter(due_date__lte=today).filter(district__iexact=request.user.profile.district)
+    old_ballots = Ballot.objects.filter(due_date__lte=today).filter(district__iexact=request.voter.district)
     context = {"ballot_list": ballot_list, "finished_ballots": finished_ballots, "old_ballots": old_ballots, "today": today}
     return render(request, 'ballots/index.html', context=context)
 
@@ -44,16 +52,17 @@ def detail(request, ballot_id):
         return redirect('/users/login/')
     try:
         ballot = Ballot.objects.get(pk=ballot_id)
-        question_list = Question.objects.filter(ballot=ballot_id)
+        question_list = Question.objects.filter(ballot=ballot_id).prefetch_related('choice_set')
         b_id = ballot_id
-        context = {'ballot': ballot, 'question_list': question_list, 'current_b_id': b_id}
+        # identifies this copy of the form, see vote()
+        context = {'ballot': ballot, 'question_list': question_list, 'current_b_id': b_id,
+                   'submission_key': get_random_string(32)}
     except Ballot.DoesNotExist:
         raise Http404("Ballot does not exist")
-    signer = Signer()
-    sign = signer.sign(request.user.profile.sign)
-    sign = sign[51:]
-    if ballot.due_date > timezone.now() and ballot.pub_date < timezone.now()\
-            and ballot.district.lower() == request.user.profile.district.lower() and not\
+    sign = request.voter.signature
+    now = timezone.now()
+    if ballot.due_date > now and ballot.pub_date < now\
+            and ballot.district.lower() == request.voter.district_key and not\
             VoteRecord.objects.filter(voter_signature=sign).filter(assoc_ballot=ballot).exists():
         return render(request, 'ballots/detail.html', context=context)
     else:
@@ -71,8 +80,9 @@ def detail_q(request, ballot_id, question_id):
         context = {'current_b_id': current_ballot, 'question': question}
     except Ballot.DoesNotExist:
         raise Http404("Ballot does not exist")
-    if ballot.pub_date > timezone.now() or ballot.due_date < timezone.now() \
-            or ballot.district.lower() != request.user.profile.district.lower():
+    now = timezone.now()
+    if ballot.pub_date > now or ballot.due_date < now \
+            or ballot.district.lower() != request.voter.district_key:
         return redirect(reverse('ballots:index'))
     return render(request, 'ballots/detail.html', context=context)
 
@@ -86,44 +96,65 @@ def results(request, ballot_id):
         raise Http404("Ballot does not exist")
     if ballot.due_date > timezone.now():
         return redirect(reverse('ballots:index'))
-    for question in question_list:
-        choices = Choice.objects.filter(question=question)
+    # archived ballots no longer have raw votes, their tallies were frozen when archived
+    if ballot.state == Ballot.ARCHIVED:
+        return render(request, 'ballots/vote.html', context=context)
+    choices = list(Choice.objects.filter(question__ballot=ballot))
+    # the lifecycle scheduler freezes the counts once when the ballot closes,
+    # until it has run they are counted here
+    if ballot.state != Ballot.TALLIED:
+        counts = choice_counts(ballot)
         for choice in choices:
-            choice.votes = CastVote.objects.filter(choice=choice).count()
-            choice.save()
+            choice.votes = counts.get(choice.id, 0)
+        Choice.objects.bulk_update(choices, ['votes'])
+        publish_tally(ballot, counts)
+    context['crosstab'] = results_crosstab(request, ballot, choices)
     return render(request, 'ballots/vote.html', context=context)
 
 
+# ?crosstab=<question id>,<question id> adds a cross tabulation of two questions to the results page
+def results_crosstab(request, ballot, choices):
+    try:
+        question1, question2 = [int(question_id) for question_id in request.GET['crosstab'].split(',')]
+    except (KeyError, ValueError):
+        return None
+    questions = Question.objects.filter(ballot=ballot).in_bulk([question1, question2])
+    if question1 not in questions or question2 not in questions:
+        return None
+    # numpy is only needed here, not in every process importing the urls
+    from ballots.tally import compute_tally
+
+    rows, cols, matrix = compute_tally(ballot, crosstabs=[(question1, question2)]).crosstab(question1, question2)
+    texts = {choice.id: choice.choice_text for choice in choices}
+    return {
+        'question1': questions[question1],
+        'question2': questions[question2],
+        'columns': [texts[choice_id] for choice_id in cols],
+        'rows': [(texts[choice_id], row.tolist()) for choice_id, row in zip(rows, matrix)],
+    }
+
+
 
 def vote(request, ballot_id):
     if not request.user.is_authenticated:
         return redirect('/users/login/')
     # print(request.POST['choice'])
+    sign = request.voter.signature
+    # a form submitted again (double click, client retry) already had its vote recorded
+    submission_key = clean_submission_key(request.POST.get('submission_key', ''))
+    if was_submitted(sign, submission_key):
+        return HttpResponseRedirect(reverse('ballots:index'))
     ballot = get_object_or_404(Ballot, pk=ballot_id)
-    questions = get_list_or_404(Question, ballot=ballot)
-    signer = Signer()
-    sign = signer.sign(request.user.profile.sign)
-    sign = sign[51:]
-    if ballot.pub_date > timezone.now() or ballot.due_date < timezone.now() \
-            or ballot.district.lower() != request.user.profile.district.lower()\
-            or VoteRecord.objects.filter(voter_signature=sign).filter(assoc_ballot=ballot).exists():
+    if not can_vote(ballot, request.voter) or has_voted(ballot, sign):
         return redirect(reverse('ballots:index'))
-    if questions:
-        selected_choices = []
-        for question in questions:
-            if request.POST.get(question.question_text):
-                selected_choices.append(question.choice_set.get(pk=request.POST[question.question_text]))
-        if len(selected_choices) > 0:
-            signer = Signer()
-            sign = signer.sign(request.user.profile.sign)
-            sign = sign[51:]
-            new_record = VoteRecord.objects.create(assoc_ballot=ballot, voter_signature=sign)
-            new_record.save()
-            new_ballot = CastBallot.objects.create(assoc_ballot=ballot)
-            new_ballot.save()
-            for choice in selected_choices:
-                new_vote = CastVote.objects.create(choice=choice, ballot=new_ballot)
-                new_vote.save()
+    picked = form_choices(request.POST)
+    selected = None if picked is None else selected_choices(ballot, picked)
+    if selected is None:
+        return HttpResponseBadRequest('Invalid choice')
+    if not selected and not Question.objects.filter(ballot=ballot).exists():
+        raise Http404("Ballot has no questions")
+    if len(selected) > 0:
+        cast_vote(ballot, sign, selected, submission_key)
     return HttpResponseRedirect(reverse('ballots:index'))
 
 
@@ -135,50 +166,60 @@ class UserAccessMixin(PermissionRequiredMixin):
             return redirect(reverse('ballots:index'))
         return super(UserAccessMixin, self).dispatch(request, *args, **kwargs)
 
+    def has_permission(self):
+        # resolved from the voter identity, cached in the shared identity cache or read for this request
+        return self.request.voter.has_perms(self.get_permission_required())
 
-class BallotAdminView(UserAccessMixin, ListView):
+
+class BallotAdminView(UserAccessMixin, KeysetListMixin, ListView):
     raise_exception = False
     permission_required = 'ballot.change_ballot'
 
     model = Ballot
     template_name = "ballot_admin.html"
     context_object_name = "ballots"
+    date_field = 'pub_date'
 
-    def get_queryset(self, *args, **kwargs):
-        return Ballot.objects.filter(pub_date__gte=timezone.now())
+    def get_queryset(self):
+        return super().get_queryset().filter(pub_date__gte=timezone.now())
 
 
-class PublishedBallotsView(UserAccessMixin, ListView):
+class PublishedBallotsView(UserAccessMixin, KeysetListMixin, ListView):
     permission_required = 'ballot.change_ballot'
 
     model = Ballot
     template_name = "published-ballots.html"
     context_object_name = "ballots"
 
-    def get_queryset(self, *args, **kwargs):
-        return Ballot.objects.filter(pub_date__lte=timezone.now()).filter(due_date__gte=timezone.now())
+    def get_queryset(self):
+        now = timezone.now()
+        return super().get_queryset().filter(pub_date__lte=now).filter(due_date__gte=now)
 
 
-class PastBallotsView(UserAccessMixin, ListView):
+class PastBallotsView(UserAccessMixin, KeysetListMixin, ListView):
     permission_required = 'ballot.change_ballot'
 
     model = Ballot
     template_name = "past-ballots.html"
     context_object_name = "ballots"
+    descending = True
 
-    def get_queryset(self, *args, **kwargs):
-        return Ballot.objects.filter(due_date__lte=timezone.now()).filter(due_date__gte=timezone.now() - datetime.timedelta(days=365.25))
+    def get_queryset(self):
+        now = timezone.now()
+        return super().get_queryset().filter(due_date__lte=now)\
+            .filter(due_date__gte=now - datetime.timedelta(days=365.25))
 
 
-class ArchivedBallotsView(UserAccessMixin, ListView):
+class ArchivedBallotsView(UserAccessMixin, KeysetListMixin, ListView):
     permission_required = "ballot.change_ballot"
 
     model = Ballot
     template_name = "archived-ballots.html"
     context_object_name = "ballots"
+    descending = True
 
-    def get_queryset(self, *args, **kwargs):
-        return Ballot.objects.filter(due_date__lte=timezone.now() - datetime.timedelta(days=365.24))
+    def get_queryset(self):
+        return super().get_queryset().filter(due_date__lte=archive_cutoff())
 
 class AddBallotView(UserAccessMixin, CreateView):
     permission_required = 'ballot.change_ballot'
@@ -192,6 +233,65 @@ class AddBallotView(UserAccessMixin, CreateView):
         return super().form_valid(form)
 
 
+class ImportBallotView(UserAccessMixin, FormView):
+    permission_required = 'ballot.change_ballot'
+
+    template_name = 'import.html'
+    form_class = ImportBallotForm
+
+    def post(self, request, *args, **kwargs):
+        # JSON clients post the definition itself as the request body
+        if request.content_type == 'application/json':
+            try:
+                self.import_definition(parse_definition(request.body.decode('utf-8')))
+            except (ValidationError, UnicodeDecodeError) as e:
+                errors = e.messages if isinstance(e, ValidationError) else ['Request body must be UTF-8']
+                return JsonResponse({'errors': errors}, status=400)
+            if isinstance(self.object, BallotFamily):
+                data = {'family': self.object.pk, 'ballots': list(self.object.ballots.values_list('id', flat=True))}
+            else:
+                data = {'id': self.object.pk}
+            data['url'] = self.get_success_url()
+            return JsonResponse(data, status=201)
+        return super().post(request, *args, **kwargs)
+
+    def import_definition(self, definition):
+        # definitions listing several districts fan out into a ballot family
+        if 'districts' in definition:
+            self.object = fan_out(definition)
+        else:
+            self.object = import_ballot(definition)
+
+    def form_valid(self, form):
+        try:
+            self.import_definition(parse_definition(form.cleaned_data['definition'], form.cleaned_data['format']))
+        except ValidationError as e:
+            for message in e.messages:
+                form.add_error(None, message)
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+    def get_success_url(self):
+        if isinstance(self.object, BallotFamily):
+            return reverse('ballots:family-results', kwargs={'pk': self.object.pk})
+        return reverse('ballots:ballot-detail', kwargs={'pk': self.object.pk})
+
+
+class FamilyResultsView(UserAccessMixin, DetailView):
+    permission_required = 'ballot.change_ballot'
+    model = BallotFamily
+    template_name = 'family-results.html'
+    context_object_name = 'family'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ballots'] = with_turnout(self.object.ballots.order_by('district'))
+        context['closed'] = self.object.due_date <= timezone.now()
+        if context['closed']:
+            context['results'], context['votes_cast'] = family_results(self.object)
+        return context
+
+
 class BallotEditView(UserAccessMixin, UpdateView):
     permission_required = 'ballot.change_ballot'
 
@@ -252,13 +352,13 @@ class AddChoiceView(UserAccessMixin, SingleObjectMixin, FormView):
     template_name = 'addchoice.html'
 
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object(queryset=Question.objects.all())
+        self.object = self.get_object(queryset=Question.objects.select_related('ballot'))
         if (self.object.ballot.pub_date <= timezone.now()):
             return redirect('/ballot-admin')
         return super().get(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
-        self.object = self.get_object(queryset=Question.objects.all())
+        self.object = self.get_object(queryset=Question.objects.select_related('ballot'))
         return super().post(request, *args, **kwargs)
 
     def get_form(self, form_class=None):
@@ -285,9 +385,14 @@ class BallotDetailView(UserAccessMixin, DetailView):
     template_name = 'ballot-detail.html'
     context_object_name = 'ballot'
 
+    def get_queryset(self):
+        return with_turnout(Ballot.objects.all())
+
     def get_context_data(self, **kwargs):
         context = super(BallotDetailView, self).get_context_data(**kwargs)
         context['today'] = timezone.now()
+        # the live event stream is served by the ASGI application only (ballots.live)
+        context['live_updates'] = isinstance(self.request, ASGIRequest)
         return context
 
 class BallotDeleteView(UserAccessMixin, DeleteView):
@@ -0,0 +1,94 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ballots.counters import record_vote
+from ballots.live import publish_turnout
+from ballots.models import Ballot, Choice, VoteRecord, VoteSubmission
+from ballots.storage import record_cast_ballot
+
+# Casting a vote, shared by the ballot form (ballots.views.vote) and the JSON API (ballots.api).
+# A vote is identified by the voter's blinded signature only, the cast ballot holding the
+# choices is not linked to it.
+
+# the ballot form names each question's radio buttons question_<question id>, their values are choice ids
+QUESTION_FIELD_PREFIX = 'question_'
+
+
+def can_vote(ballot, voter, now=None):
+    """
+    whether the ballot is open and in the voter's district, not whether they already voted
+    """
+    now = now or timezone.now()
+    return ballot.pub_date <= now <= ballot.due_date and ballot.district.lower() == voter.district_key
+
+
+def has_voted(ballot, signature):
+    return VoteRecord.objects.filter(voter_signature=signature, assoc_ballot=ballot).exists()
+
+
+def clean_submission_key(key):
+    """
+    the key identifying a submitted form or API request, '' when missing or too long to be one
+    """
+    if not isinstance(key, str) or len(key) > VoteSubmission._meta.get_field('key').max_length:
+        return ''
+    return key
+
+
+def was_submitted(signature, key):
+    return bool(key) and VoteSubmission.objects.filter(key=key, voter_signature=signature).exists()
+
+
+def form_choices(data):
+    """
+    {question id: choice id} from the question_<id> fields of a submitted ballot form, None when one is malformed
+    """
+    picked = {}
+    for name, value in data.items():
+        if name.startswith(QUESTION_FIELD_PREFIX) and value:
+            try:
+                picked[int(name[len(QUESTION_FIELD_PREFIX):])] = int(value)
+            except ValueError:
+                return None
+    return picked
+
+
+def selected_choices(ballot, picked):
+    """
+    the choices of {question id: choice id}, checked against the ballot's questions in one query,
+    None when a choice is not one of its question's
+    """
+    if not picked:
+        return []
+    choices = list(Choice.objects.filter(id__in=picked.values(), question__ballot=ballot).only('id', 'question_id'))
+    if len(choices) != len(picked) or any(picked.get(choice.question_id) != choice.id for choice in choices):
+        return None
+    return choices
+
+
+def cast_vote(ballot, signature, choices, submission_key=''):
+    """
+    records the voter's vote and the anonymous cast ballot, returns False when a concurrent request
+    recorded this submission or this voter's vote first, in which case nothing was counted
+    """
+    try:
+        with transaction.atomic():
+            if submission_key:
+                VoteSubmission.objects.create(key=submission_key, assoc_ballot=ballot, voter_signature=signature)
+            VoteRecord.objects.create(assoc_ballot=ballot, voter_signature=signature)
+            record_cast_ballot(ballot, choices)
+            record_vote(ballot)
+            publish_turnout(ballot)
+    except IntegrityError:
+        return False
+    return True
+
+
+def eligible_ballots(voter, now=None):
+    """
+    the open ballots of the voter's district they have not voted on, soonest due first
+    """
+    now = now or timezone.now()
+    return Ballot.objects.filter(pub_date__lte=now, due_date__gte=now, district__iexact=voter.district)\
+        .exclude(id__in=VoteRecord.objects.filter(voter_signature=voter.signature).values('assoc_ballot'))\
+        .order_by('due_date', 'id')
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Temporary, until Django is upgraded past 3.2: Django 3.2 imports distutils, and setuptools' replacement
+# of it loads pkg_resources on the way. This package is imported before Django by manage.py, wsgi.py and
+# asgi.py. Python 3.12 no longer ships distutils, there setuptools' copy is the only one.
+if sys.version_info < (3, 12):
+    os.environ.setdefault('SETUPTOOLS_USE_DISTUTILS', 'stdlib')
@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blind_voting_app.settings_shared')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, serves the live results event streams without a worker thread per client
+from ballots.live import LiveResultsRouter
+from blind_voting_app.startup import warm_up
+
+application = LiveResultsRouter(django_application)
+
+# compiles the templates before the first request
+warm_up()
@@ -0,0 +1,16 @@
+from django.conf import settings
+
+# A local memory cache is private to one worker process: what one worker deletes from it stays in
+# the others. Who is signed in, their district and permissions, and the rate limit counters must
+# be the same for every worker, so they are only cached in a backend all of them share, which for
+# these backends also makes add and incr atomic.
+
+SHARED_BACKENDS = (
+    'django_redis.cache.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+def is_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] in SHARED_BACKENDS
@@ -9,7 +9,6 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 import os
 import django_heroku
-import dj_database_url
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,10 +31,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.VoterIdentityMiddleware',
+    'blind_voting_app.throttle.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +81,15 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Sessions' users are loaded with their profile and, in IDENTITY_CACHE, cached across requests, see
+# users.backends. The cache must be shared by every worker (checked by users.checks), without Redis
+# nothing is cached.
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedUserBackend']
+
+IDENTITY_CACHE = 'default' if os.getenv('REDIS_URL') else None
+
+
 # Added for Login Functionality
 
 LOGIN_REDIRECT_URL = '/'
@@ -109,6 +120,87 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# Served by whitenoise. In production collectstatic writes content hashed names (cached for ten years
+# by browsers) with gzip and, when Brotli is installed, brotli variants next to them, see below.
+# Development and tests serve the files as they are, without running collectstatic first.
+# http://whitenoise.evans.io/en/stable/django.html
+
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+# Cache, shared by every worker and dyno when REDIS_URL is set (Heroku Redis), otherwise a per process
+# local memory cache which only holds data that may differ between workers (blind_voting_app.caches)
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Rate limits and admission control (blind_voting_app.throttle), on in production unless THROTTLE=off.
+# RATE_LIMITS maps url names to (tokens per second, burst) buckets per signed in user and per client address,
+# VOTE_CONCURRENCY caps the votes processed at once by all workers sharing THROTTLE_CACHE, which must be the
+# Redis cache (REDIS_URL), with a local memory cache nothing is throttled.
+
+THROTTLE_ENABLED = os.getenv('THROTTLE', 'on' if os.getenv('DJANGO_ENV') == 'production' else 'off') == 'on'
+
+THROTTLE_CACHE = 'default'
+
+# behind the Heroku router REMOTE_ADDR is the router, the client address is the last X-Forwarded-For entry
+THROTTLE_FORWARDED_FOR = os.getenv('DJANGO_ENV') == 'production'
+
+RATE_LIMITS = {
+    'ballots:vote': {'user': (0.2, 5), 'ip': (2, 60)},
+    'ballots:detail': {'user': (1, 20), 'ip': (5, 120)},
+    'api-v1:vote': {'user': (0.2, 5), 'ip': (2, 60)},
+    'api-v1:ballot': {'user': (1, 20), 'ip': (5, 120)},
+    'login': {'ip': (0.2, 10)},
+}
+
+VOTE_CONCURRENCY = int(os.getenv('VOTE_CONCURRENCY', 8))
+
+
+# Session storage tier, SESSION_TIER is one of
+#   db              a django_session read on every authenticated request, the default without REDIS_URL
+#   cached_db       reads served from the cache, writes go through to the database, the default with REDIS_URL.
+#                   A per process cache would keep a logged out session alive in the other workers
+#   cache           sessions only live in the cache, needs a cache shared by all workers
+#   signed_cookies  sessions live in the client's signed cookie, no server side storage
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/#configuring-the-session-engine
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSION_ENGINE = SESSION_ENGINES[os.getenv('SESSION_TIER', 'cached_db' if REDIS_URL else 'db')]
+
+# Flash messages ride in their own cookie rather than writing to the session
+
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Cast ballot storage format, 'rows' (CastBallot/CastVote) or 'packed' (PackedCastBallot)
+
+BALLOTS_CAST_STORAGE = os.getenv('BALLOTS_CAST_STORAGE', 'rows')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -124,11 +216,31 @@ if os.getenv('DJANGO_ENV') != 'production':
 else:
     # DB config
 
+    import dj_database_url
+
     DATABASES = { 'default': dj_database_url.config() }
 
     DATABASES['default']['ATOMIC_REQUESTS'] = True
 
-    DEBUG = True
+    # Debug mode keeps every SQL query in memory and recompiles templates on each request,
+    # only turn it on to diagnose a problem
+
+    DEBUG = os.getenv('DJANGO_DEBUG') == 'true'
+
+    # Templates are compiled once per worker and kept, blind_voting_app.startup warms them on boot
+
+    TEMPLATES[0]['APP_DIRS'] = False
+
+    # Fingerprinted and pre-compressed static files, built by collectstatic during the Heroku build
+
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
 
     # For profile encryption
 
@@ -150,6 +262,13 @@ else:
 
     EMAIL_HOST_PORT = 587
 
+    # Receive the results of every tallied ballot (ballots.lifecycle), comma separated addresses.
+    # Django also emails them the details of every server error (500) response.
+
+    ADMINS = [('Admin', email.strip()) for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()]
+
+    SERVER_EMAIL = DEFAULT_FROM_EMAIL
+
 
 
 
@@ -158,4 +277,4 @@ else:
 # Special PostgreSQL etc configurationfor Heroku deployment
 # https://devcenter.heroku.com/articles/deploying-python
 
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals(), staticfiles=False)
\ No newline at end of file
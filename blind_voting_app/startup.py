@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.signing import Signer
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver, reverse
+
+# Work done once when the application is loaded rather than on the first requests. Under gunicorn
+# with preload_app (see gunicorn.conf.py) it runs in the master before forking, so every worker
+# starts warm and shares the result copy-on-write.
+
+# seconds spent in each warm up step, logged by gunicorn.conf.py
+timings = {}
+
+
+def project_template_dirs():
+    """
+    the project's own template directories (ballots/templates, users/templates, ...), not those of django.contrib
+    """
+    dirs = [str(directory) for directory in engines['django'].engine.dirs]
+    dirs += [str(directory) for directory in get_app_template_dirs('templates')]
+    return [directory for directory in dirs if os.path.isdir(directory) and directory.startswith(settings.BASE_DIR)]
+
+
+def template_names():
+    names = set()
+    for directory in project_template_dirs():
+        for root, subdirs, files in os.walk(directory):
+            for file_name in files:
+                if file_name.endswith('.html'):
+                    names.add(os.path.relpath(os.path.join(root, file_name), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    compiles every project template into the cached template loader, returns the number of templates
+    """
+    engine = engines['django'].engine
+    names = template_names()
+    for name in names:
+        engine.get_template(name)
+    return len(names)
+
+
+def warm_urls():
+    """
+    imports every view module and builds the URL resolver's reverse lookup tables
+    """
+    resolver = get_resolver()
+    resolver.url_patterns
+    reverse('ballots:index')
+    return len(resolver.reverse_dict)
+
+
+def warm_crypto():
+    """
+    derives the profile encryption keys and runs the vote signer once so their keys and cipher backends are ready
+    """
+    from users.fields import encrypt_values, decrypt_values
+    decrypt_values(encrypt_values(['']))
+    Signer().sign('warm-up')
+
+
+def warm_up():
+    steps = [('urls', warm_urls), ('crypto', warm_crypto)]
+    if not settings.DEBUG:
+        steps.append(('templates', warm_templates))
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,49 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.template import engines
+from django.test import TestCase
+
+from ballots.management.commands.import_profile import parse_importtime
+from blind_voting_app.startup import template_names, warm_templates, warm_up
+
+
+class TemplateWarmupTests(TestCase):
+    def test_project_templates_only(self):
+        names = template_names()
+        self.assertIn('ballots/index.html', names)
+        self.assertIn('login_form.html', names)
+        self.assertNotIn('admin/base.html', names)
+
+    def test_warm_templates(self):
+        self.assertEqual(warm_templates(), len(template_names()))
+        self.assertIn('base.html', engines['django'].engine.template_loaders[0].get_template_cache)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_templates', repeat=1, stdout=out)
+        self.assertIn('cached render', out.getvalue())
+
+    def test_warm_up_records_timings(self):
+        timings = warm_up()
+        self.assertEqual(set(timings), {'urls', 'crypto', 'templates'})
+
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       300 |       1200 |   django.utils.version
+import time:       400 |       1600 | django
+import time: phase urls
+import time:      2000 |       2000 |   ballots.models
+import time:      3000 |       5000 | ballots.views
+"""
+
+
+class ImportProfileTests(TestCase):
+    def test_parse_importtime(self):
+        self.assertEqual(parse_importtime(IMPORTTIME_OUTPUT), {'setup': {'django': 1.6}, 'urls': {'ballots.views': 5.0}})
+
+    def test_command(self):
+        out = StringIO()
+        call_command('import_profile', repeat=1, top=3, stdout=out)
+        self.assertIn('setup', out.getvalue())
+        self.assertIn('ballots.views', out.getvalue())
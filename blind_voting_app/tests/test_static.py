@@ -0,0 +1,41 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.client.force_login(self.user)
+
+    def assertLocalAssets(self, response):
+        self.assertContains(response, staticfiles_storage.url('vendor/css/bootstrap.min.css'))
+        self.assertNotContains(response, 'https://')
+
+    def test_pages_use_local_assets(self):
+        self.assertLocalAssets(self.client.get(reverse('ballots:index')))
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        self.assertLocalAssets(self.client.get(reverse('ballots:ballot-admin')))
+
+    def test_hashed_assets_cached_forever(self):
+        # production's storage, collected into a scratch directory
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        with self.settings(STATIC_ROOT=static_root,
+                           STATICFILES_STORAGE='whitenoise.storage.CompressedManifestStaticFilesStorage'):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.assertHashedAssetCachedForever()
+
+    def assertHashedAssetCachedForever(self):
+        url = staticfiles_storage.url('vendor/css/bootstrap.min.css')
+        self.assertRegex(url, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(response['Content-Encoding'], ['br', 'gzip'])
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ballots.models import Ballot, Question, Choice, VoteRecord
+from blind_voting_app.throttle import ConcurrencyLimit, TokenBucket
+
+
+@override_settings(
+    THROTTLE_ENABLED=True,
+    THROTTLE_FORWARDED_FOR=True,
+    RATE_LIMITS={
+        'ballots:vote': {'user': (0.1, 3)},
+        'ballots:detail': {'user': (0.1, 2), 'ip': (0.1, 3)},
+        'login': {'ip': (0.1, 2)},
+    },
+    VOTE_CONCURRENCY=2,
+)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # the local memory cache of the tests stands in for Redis, this test process is the only worker
+        patcher = mock.patch('blind_voting_app.throttle.is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.ballot = Ballot.objects.create(ballot_title="Test", district="BaltimoreCounty", pub_date=timezone.now())
+        self.question = Question.objects.create(question_text="Q1", ballot=self.ballot)
+        self.choice = Choice.objects.create(choice_text="A", question=self.question)
+        self.client.force_login(self.user)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(cache, 'test-bucket', rate=0.5, burst=2)
+        self.assertEqual(bucket.take(now=100), 0)
+        self.assertEqual(bucket.take(now=100), 0)
+        self.assertEqual(bucket.take(now=100), 2)
+        # one token is back after two seconds
+        self.assertEqual(bucket.take(now=102), 0)
+        self.assertEqual(bucket.take(now=102), 2)
+
+    def test_concurrency_limit_expiry(self):
+        limit = ConcurrencyLimit(cache, 'test-votes', limit=2, timeout=60)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1000):
+            self.assertTrue(limit.acquire())
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1050):
+            self.assertTrue(limit.acquire())
+        # both slots are still held past the first acquire's expiry
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1100):
+            self.assertFalse(limit.acquire())
+            limit.release()
+            self.assertTrue(limit.acquire())
+        # released once nothing was acquired for the timeout
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1200):
+            self.assertTrue(limit.acquire())
+            self.assertEqual(cache.get('test-votes'), 1)
+
+    def test_user_limit(self):
+        url = reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk})
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+
+        # other users have their own bucket
+        other = User.objects.create(username='other')
+        other.profile.district = "BaltimoreCounty"
+        other.profile.save()
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_address_limit(self):
+        self.client.logout()
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('login'), HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 200)
+        self.assertEqual(self.client.get(reverse('login'), HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 429)
+        # the address the router appended is the one counted
+        self.assertEqual(self.client.get(reverse('login'), HTTP_X_FORWARDED_FOR='10.0.0.1, 10.0.0.2').status_code, 200)
+
+    def test_vote_concurrency(self):
+        url = reverse('ballots:vote', kwargs={'ballot_id': self.ballot.pk})
+        cache.set('throttle:votes', 2)
+        response = self.client.post(url, {'question_%d' % self.question.pk: self.choice.pk})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(VoteRecord.objects.exists())
+        self.assertEqual(cache.get('throttle:votes'), 2)
+
+        cache.set('throttle:votes', 1)
+        self.client.post(url, {'question_%d' % self.question.pk: self.choice.pk})
+        self.assertTrue(VoteRecord.objects.exists())
+        # the slot is released once the vote is done
+        self.assertEqual(cache.get('throttle:votes'), 1)
+
+    def test_api_vote_concurrency(self):
+        cache.set('throttle:votes', 2)
+        response = self.client.post(reverse('api-v1:vote', kwargs={'ballot_id': self.ballot.pk}),
+                                    {'choices': {str(self.question.pk): self.choice.pk}}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(VoteRecord.objects.exists())
+
+    def test_unlisted_views_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('ballots:index')).status_code, 200)
+
+    def test_local_cache_not_throttled(self):
+        mock.patch.stopall()
+        url = reverse('ballots:detail', kwargs={'ballot_id': self.ballot.pk})
+        with self.assertWarnsRegex(RuntimeWarning, 'THROTTLE_CACHE is not shared'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,135 @@
+import math
+import time
+import warnings
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from blind_voting_app.caches import is_shared
+
+# Sheds load before it reaches the database: requests to the views named in RATE_LIMITS take a token
+# from a bucket per signed in user and one per client address, and at most VOTE_CONCURRENCY votes are
+# processed at once across all workers. Buckets and the vote counter live in THROTTLE_CACHE, which must
+# be shared by the workers (blind_voting_app.caches), the middleware turns itself off otherwise.
+
+# the views casting votes, from the ballot form and the API
+VOTE_VIEWS = ('ballots:vote', 'api-v1:vote')
+
+
+class TokenBucket:
+    """
+    holds up to burst tokens refilled at rate tokens per second, stored as (tokens, last update) in a cache.
+    The read and write are not atomic, concurrent requests may occasionally share a token.
+    """
+    def __init__(self, cache, key, rate, burst):
+        self.cache = cache
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    def take(self, now=None):
+        """
+        returns 0 when a token was taken, otherwise the seconds until one is available
+        """
+        now = time.time() if now is None else now
+        tokens, updated = self.cache.get(self.key) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+        if not wait:
+            tokens -= 1
+        # an unused bucket is full again once it expires
+        self.cache.set(self.key, (tokens, now), math.ceil(self.burst / self.rate) + 1)
+        return wait
+
+
+class ConcurrencyLimit:
+    """
+    counts the requests in progress in a cache so the limit holds across workers. The count expires
+    timeout seconds after the last acquire, so slots held by a crashed worker are eventually released
+    but the count is not reset while requests keep coming.
+    """
+    def __init__(self, cache, key, limit, timeout=60):
+        self.cache = cache
+        self.key = key
+        self.limit = limit
+        self.timeout = timeout
+
+    def acquire(self):
+        self.cache.add(self.key, 0, self.timeout)
+        try:
+            in_progress = self.cache.incr(self.key)
+        except ValueError:
+            # expired between add and incr
+            self.cache.add(self.key, 1, self.timeout)
+            return True
+        # incr keeps the expiry set by add
+        self.cache.touch(self.key, self.timeout)
+        if in_progress <= self.limit:
+            return True
+        self.release()
+        return False
+
+    def release(self):
+        try:
+            self.cache.decr(self.key)
+        except ValueError:
+            pass
+
+
+def client_address(request):
+    if settings.THROTTLE_FORWARDED_FOR and request.META.get('HTTP_X_FORWARDED_FOR'):
+        # the router appends the address it received the request from to the end
+        return request.META['HTTP_X_FORWARDED_FOR'].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rejected(status, retry_after, message):
+    response = HttpResponse(message, status=status, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionControlMiddleware:
+    """
+    answers with a fast 429 when a user or address is over its rate limit and a 503 when too many
+    votes are in progress, both with Retry-After. Must come after AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        if not settings.THROTTLE_ENABLED:
+            raise MiddlewareNotUsed
+        if not is_shared(settings.THROTTLE_CACHE):
+            # every worker would count on its own, multiplying the limits by the number of workers
+            warnings.warn('THROTTLE_CACHE is not shared by every worker process, requests are not throttled',
+                          RuntimeWarning)
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.votes = ConcurrencyLimit(self.cache, 'throttle:votes', settings.VOTE_CONCURRENCY)
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            if getattr(request, 'holds_vote_slot', False):
+                self.votes.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        limits = settings.RATE_LIMITS.get(view_name, {})
+        buckets = []
+        if 'user' in limits and request.user.is_authenticated:
+            buckets.append(('user', request.user.pk))
+        if 'ip' in limits:
+            buckets.append(('ip', client_address(request)))
+        for kind, identifier in buckets:
+            rate, burst = limits[kind]
+            wait = TokenBucket(self.cache, 'throttle:%s:%s:%s' % (view_name, kind, identifier), rate, burst).take()
+            if wait:
+                return rejected(429, wait, 'Too many requests, please try again shortly.')
+        if view_name in VOTE_VIEWS and request.method == 'POST':
+            if not self.votes.acquire():
+                return rejected(503, 1, 'Too many votes are being counted, please try again shortly.')
+            request.holds_vote_slot = True
+        return None
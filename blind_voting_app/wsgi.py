@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blind_voting_app.settings_shared')
 
 application = get_wsgi_application()
+
+# Imported once Django is set up, compiles the templates before the first request
+from blind_voting_app.startup import warm_up
+
+warm_up()
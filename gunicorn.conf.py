@@ -0,0 +1,39 @@
+# gunicorn settings, read from the working directory when gunicorn starts
+# https://docs.gunicorn.org/en/20.x/settings.html
+
+import gc
+import os
+import time
+
+# Load Django and warm it up (blind_voting_app.startup) once in the master, then fork the workers
+# from it: they boot without importing anything and share the loaded code copy-on-write.
+preload_app = True
+
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+
+# Heroku's router gives up on a request after 30 seconds
+timeout = 30
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    from django.db import connections
+    from blind_voting_app import startup
+
+    server.log.info('Application loaded in %.2f s (%s)', time.perf_counter() - _started,
+                    ', '.join('%s %.3f s' % (step, seconds) for step, seconds in startup.timings.items()))
+    # a connection opened while warming up must not be shared between workers
+    connections.close_all()
+    # move everything loaded so far out of the collector's reach, collections in the workers
+    # would otherwise write to every object's header and unshare the pages holding them
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    worker.log.info('Worker %s booted in %.3f s', worker.pid, time.perf_counter() - worker.forked_at)
@@ -3,6 +3,9 @@
 import os
 import sys
 
+# sets up the environment before Django is imported, see blind_voting_app/__init__.py
+import blind_voting_app
+
 
 def main():
     """Run administrative tasks."""
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.models import User
+from .fields import ssn_index
 from .models import Profile
 
 class ProfileInline(admin.StackedInline):
@@ -15,14 +16,26 @@ class UserAdmin(DjangoUserAdmin):
     add_fieldsets = DjangoUserAdmin.add_fieldsets + ((None, {'fields': ['email']}),)
     list_display = ('username', 'email', 'last_name', 'first_name', 'middle_name', 'ssn', 'district', 'is_staff')
 
+    def get_queryset(self, request):
+        # the profile columns come from the same query, the ssn is only decrypted for the rows displayed
+        return super().get_queryset(request).select_related('profile')
+
+    def get_search_results(self, request, queryset, search_term):
+        # an exact ssn is found through its blind index, the encrypted column itself can not be searched
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        index = ssn_index(search_term)
+        if index:
+            results |= queryset.filter(profile__ssn_index=index)
+        return results, may_have_duplicates
+
     def middle_name(self, obj):
-        return Profile.objects.get(user=obj).middle_name
+        return obj.profile.middle_name
 
     def district(self, obj):
-        return Profile.objects.get(user=obj).district
+        return obj.profile.district
 
     def ssn(self, obj):
-        return Profile.objects.get(user=obj).ssn
+        return obj.profile.ssn
 
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
\ No newline at end of file
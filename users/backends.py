@@ -0,0 +1,22 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+from users.identity import identity_cache, user_cache_key, IDENTITY_CACHE_SECONDS
+
+
+class CachedUserBackend(ModelBackend):
+    """
+    ModelBackend loading the session's user together with its profile in one query and keeping them
+    in the identity cache when there is one, the encrypted ssn is deferred so it never reaches the cache
+    """
+    def get_user(self, user_id):
+        cache = identity_cache()
+        key = user_cache_key(user_id)
+        user = cache.get(key) if cache is not None else None
+        if user is None:
+            user = User._default_manager.select_related('profile').defer('profile__ssn').filter(pk=user_id).first()
+            if user is None:
+                return None
+            if cache is not None:
+                cache.set(key, user, IDENTITY_CACHE_SECONDS)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from blind_voting_app.caches import is_shared
+
+
+@register()
+def check_identity_cache(app_configs, **kwargs):
+    """
+    an identity dropped from a per process cache would stay cached in the other workers
+    """
+    if settings.IDENTITY_CACHE and not is_shared(settings.IDENTITY_CACHE):
+        return [Error('IDENTITY_CACHE is not shared by every worker process',
+                      hint='Use a Redis or memcached cache or set IDENTITY_CACHE = None', id='users.E001')]
+    return []
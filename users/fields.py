@@ -0,0 +1,184 @@
+import hmac
+import os
+import pickle
+import struct
+import time
+from functools import lru_cache
+
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from django.utils.crypto import salted_hmac
+from django.utils.encoding import force_bytes
+
+# Values are stored in django_cryptography's format so existing rows stay readable:
+#   version byte 0x80 | 8 byte timestamp | 16 byte iv | AES-CBC(pickle(value)) | HMAC-SHA256 of everything before it
+# The AES key is derived from CRYPTOGRAPHY_KEY (or SECRET_KEY) with PBKDF2, the HMAC key is SECRET_KEY.
+
+VERSION = b'\x80'
+HEADER = struct.Struct('>cQ')
+IV_SIZE = 16
+MAC_SIZE = 32
+KDF_ITERATIONS = 30000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class Ciphertext(bytes):
+    """
+    an encrypted value loaded from the database and not decrypted yet
+    """
+
+
+@lru_cache(maxsize=None)
+def _derive_keys(key, salt, secret, derived):
+    if not derived:
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+        key = kdf.derive(key or secret)
+    return algorithms.AES(key), secret
+
+
+def get_keys():
+    """
+    the AES algorithm and HMAC key, derived once per process and settings
+    """
+    # once django_cryptography is imported (by the old migrations) its settings class has replaced
+    # CRYPTOGRAPHY_KEY with the derived key and set CRYPTOGRAPHY_BACKEND
+    return _derive_keys(force_bytes(getattr(settings, 'CRYPTOGRAPHY_KEY', None) or b''),
+                        force_bytes(getattr(settings, 'CRYPTOGRAPHY_SALT', 'django-cryptography')),
+                        force_bytes(settings.SECRET_KEY),
+                        hasattr(settings, 'CRYPTOGRAPHY_BACKEND'))
+
+
+def encrypt_values(values):
+    """
+    encrypts a list of values with one key lookup, returns their tokens
+    """
+    aes, signing_key = get_keys()
+    timestamp = int(time.time())
+    tokens = []
+    for value in values:
+        padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        data = padder.update(pickle.dumps(value)) + padder.finalize()
+        iv = os.urandom(IV_SIZE)
+        encryptor = Cipher(aes, modes.CBC(iv)).encryptor()
+        payload = HEADER.pack(VERSION, timestamp) + iv + encryptor.update(data) + encryptor.finalize()
+        tokens.append(payload + hmac.digest(signing_key, payload, 'sha256'))
+    return tokens
+
+
+def decrypt_values(tokens):
+    """
+    decrypts a list of tokens with one key lookup, None stays None
+    """
+    aes, signing_key = get_keys()
+    values = []
+    for token in tokens:
+        if token is None:
+            values.append(None)
+            continue
+        token = bytes(token)
+        payload, mac = token[:-MAC_SIZE], token[-MAC_SIZE:]
+        if len(payload) < HEADER.size + IV_SIZE or payload[:1] != VERSION:
+            raise InvalidToken('Encrypted value is not valid')
+        if not hmac.compare_digest(mac, hmac.digest(signing_key, payload, 'sha256')):
+            raise InvalidToken('Encrypted value signature does not match')
+        iv = payload[HEADER.size:HEADER.size + IV_SIZE]
+        decryptor = Cipher(aes, modes.CBC(iv)).decryptor()
+        unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+        try:
+            data = decryptor.update(payload[HEADER.size + IV_SIZE:]) + decryptor.finalize()
+            data = unpadder.update(data) + unpadder.finalize()
+        except ValueError:
+            raise InvalidToken('Encrypted value is not valid')
+        values.append(pickle.loads(data))
+    return values
+
+
+def decrypt_instances(instances, field_name):
+    """
+    decrypts field_name on every loaded instance in one batch, for exports touching many rows
+    """
+    attname = instances[0]._meta.get_field(field_name).attname if instances else field_name
+    pending = [instance for instance in instances if isinstance(instance.__dict__.get(attname), Ciphertext)]
+    for instance, value in zip(pending, decrypt_values([instance.__dict__[attname] for instance in pending])):
+        instance.__dict__[attname] = value
+    return instances
+
+
+def blind_index(value, purpose):
+    """
+    keyed HMAC of value, equal values give equal indexes that can be searched without decrypting anything
+    """
+    return salted_hmac('users.fields.blind_index.' + purpose, value, algorithm='sha256').hexdigest()
+
+
+def ssn_index(ssn):
+    """
+    the blind index of an ssn ignoring its formatting, None for an empty ssn
+    """
+    digits = ''.join(character for character in ssn or '' if character.isdigit())
+    return blind_index(digits, 'ssn') if digits else None
+
+
+class DecryptingAttribute(DeferredAttribute):
+    """
+    keeps the ciphertext loaded from the database on the instance and decrypts it on first access
+    """
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, Ciphertext):
+            value = instance.__dict__[self.field.attname] = decrypt_values([value])[0]
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class EncryptedCharField(models.CharField):
+    """
+    CharField stored encrypted, loading a row costs no crypto work until the attribute is read
+    and saving a value that was never read writes the ciphertext back unchanged.
+    Only isnull lookups are supported, values() and values_list() return Ciphertext.
+    """
+    descriptor_class = DecryptingAttribute
+    supported_lookups = ('isnull',)
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def get_lookup(self, lookup_name):
+        if lookup_name in self.supported_lookups:
+            return super().get_lookup(lookup_name)
+
+    def get_transform(self, lookup_name):
+        if lookup_name in self.supported_lookups:
+            return super().get_transform(lookup_name)
+
+    def pre_save(self, model_instance, add):
+        # read past the descriptor so an untouched value is not decrypted just to be encrypted again
+        return model_instance.__dict__.get(self.attname)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if not isinstance(value, Ciphertext):
+            value = encrypt_values([self.to_python(value)])[0]
+        return connection.Database.Binary(value)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return Ciphertext(force_bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, Ciphertext):
+            return value
+        return super().to_python(value)
@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signing import Signer
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from users.models import Profile
+
+# The user, with its profile, and a compact voter identity derived from them are cached per user
+# in IDENTITY_CACHE so that authenticated requests start without identity or permission queries.
+# Both are dropped whenever the user or the profile is saved or deleted, users.permissions drops
+# them when the user's groups or permissions change. The drop has to reach every worker, so
+# IDENTITY_CACHE must be shared by all of them (blind_voting_app.caches). Without one the identity
+# only lives as long as the request and permissions are read when first checked.
+
+IDENTITY_CACHE_SECONDS = 60 * 60
+
+
+def identity_cache():
+    """
+    the cache holding users and identities across requests, None when they are not cached
+    """
+    return caches[settings.IDENTITY_CACHE] if settings.IDENTITY_CACHE else None
+
+
+def user_cache_key(user_id):
+    return 'users:user:%s' % user_id
+
+
+def identity_cache_key(user_id):
+    return 'users:identity:%s' % user_id
+
+
+class VoterIdentity(namedtuple('VoterIdentity', ['user_id', 'district', 'signature', 'is_superuser', 'permissions'])):
+    """
+    what the voting views need to know about the signed in voter, signature is the blinded signature
+    recorded on VoteRecord
+    """
+    __slots__ = ()
+
+    @property
+    def district_key(self):
+        return self.district.lower()
+
+    def has_perm(self, perm):
+        return self.is_superuser or perm in self.permissions
+
+    def has_perms(self, perms):
+        return all(self.has_perm(perm) for perm in perms)
+
+
+def blinded_signature(profile):
+    return Signer().sign(profile.sign)[51:]
+
+
+def build_identity(user, lazy_permissions=False):
+    profile = user.profile
+    if user.is_superuser:
+        permissions = frozenset()
+    elif lazy_permissions:
+        permissions = SimpleLazyObject(lambda: frozenset(user.get_all_permissions()))
+    else:
+        permissions = frozenset(user.get_all_permissions())
+    return VoterIdentity(
+        user_id=user.pk,
+        district=profile.district,
+        signature=blinded_signature(profile),
+        # as in User.has_perm, active superusers have every permission and need no lookup
+        is_superuser=user.is_active and user.is_superuser,
+        permissions=permissions,
+    )
+
+
+def get_identity(user):
+    cache = identity_cache()
+    if cache is None:
+        # the voting views never check permissions, they are only queried when needed
+        return build_identity(user, lazy_permissions=True)
+    key = identity_cache_key(user.pk)
+    identity = cache.get(key)
+    if identity is None:
+        identity = build_identity(user)
+        cache.set(key, identity, IDENTITY_CACHE_SECONDS)
+    return identity
+
+
+def invalidate_users(user_ids):
+    cache = identity_cache()
+    if cache is None:
+        return
+    keys = [key for user_id in user_ids for key in (user_cache_key(user_id), identity_cache_key(user_id))]
+    cache.delete_many(keys)
+    # a request reading the old rows before the change commits may have cached them again meanwhile
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user(user_id):
+    invalidate_users([user_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.core.mail import send_mass_mail
+from django.db import models, router, transaction
+from django.db.models.functions import Lower
+
+from ballots.counters import rebuild_counters
+from users.identity import invalidate_users
+from users.models import Profile, account_deleted_message
+
+# Bulk maintenance of voter accounts. Each chunk is one set based statement per table, so none
+# of the per row signals run: the deleted account emails, turnout counters and identity caches
+# they would have updated are handled once for the whole operation instead. The command runs in
+# its own process, its changes reach the site's workers because identities are either cached in
+# the shared IDENTITY_CACHE, where they are dropped, or not cached at all (users.identity).
+
+CHUNK_SIZE = 1000
+
+
+def voters(district=None, usernames=None):
+    """
+    ids of the voter accounts matching the filters, staff and superusers are never included
+    """
+    queryset = User.objects.filter(is_staff=False, is_superuser=False)
+    if district is not None:
+        queryset = queryset.annotate(district_key=Lower('profile__district')).filter(district_key=district.lower())
+    if usernames is not None:
+        queryset = queryset.filter(username__in=usernames)
+    return list(queryset.order_by('id').values_list('id', flat=True))
+
+
+def chunks(ids, size=CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def affected_districts(user_ids):
+    districts = set()
+    for chunk in chunks(user_ids):
+        districts.update(Profile.objects.filter(user_id__in=chunk).values_list('district', flat=True))
+    return districts
+
+
+def _raw_delete(queryset):
+    # QuerySet.delete() would load every row to send pre_delete and post_delete
+    queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def _delete_users(user_ids):
+    for relation in User._meta.related_objects:
+        if relation.on_delete is not models.CASCADE:
+            raise ValueError('%s references users without cascading deletes' % relation.related_model.__name__)
+        _raw_delete(relation.related_model._base_manager.filter(**{relation.field.name + '__in': user_ids}))
+    for field in User._meta.many_to_many:
+        _raw_delete(field.remote_field.through._base_manager.filter(**{field.m2m_field_name() + '__in': user_ids}))
+    _raw_delete(User._base_manager.filter(id__in=user_ids))
+
+
+def purge(user_ids, notify=True):
+    """
+    deletes the accounts and their profiles chunk by chunk, then emails every deleted voter over one
+    connection and rebuilds the counters of their districts, returns the number of accounts deleted.
+    When a chunk fails the voters of the chunks already deleted are still emailed.
+    """
+    districts = affected_districts(user_ids)
+    messages = []
+    try:
+        for chunk in chunks(user_ids):
+            with transaction.atomic():
+                chunk_messages = []
+                if notify:
+                    chunk_messages = [account_deleted_message(username, email) for username, email in
+                                      User.objects.filter(id__in=chunk).exclude(email='').values_list('username', 'email')]
+                _delete_users(chunk)
+            # only once the chunk's accounts are gone for good
+            messages.extend(chunk_messages)
+    finally:
+        rebuild_counters(districts)
+        invalidate_users(user_ids)
+        if messages:
+            # one SMTP connection for every message
+            send_mass_mail(messages, fail_silently=False)
+    return len(user_ids)
+
+
+def redistrict(user_ids, district):
+    """
+    moves the voters' profiles to district and rebuilds the counters of the old and new districts
+    """
+    districts = affected_districts(user_ids) | {district}
+    try:
+        for chunk in chunks(user_ids):
+            Profile.objects.filter(user_id__in=chunk).update(district=district)
+    finally:
+        rebuild_counters(districts)
+        invalidate_users(user_ids)
+    return len(user_ids)
+
+
+def deactivate(user_ids):
+    """
+    marks the accounts inactive, their cached users are dropped so the next request signs them out
+    """
+    try:
+        for chunk in chunks(user_ids):
+            User.objects.filter(id__in=chunk).update(is_active=False)
+    finally:
+        invalidate_users(user_ids)
+    return len(user_ids)
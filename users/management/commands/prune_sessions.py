@@ -0,0 +1,34 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in small batches so the session table never holds long locks, ' \
+           'meant to be run on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per statement')
+
+    def handle(self, *args, **options):
+        engine = settings.SESSION_ENGINE
+        if engine.endswith('.db') or engine.endswith('.cached_db'):
+            deleted = self.prune_table(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS('Deleted %d expired sessions' % deleted))
+            return
+        # cache and signed cookie sessions expire on their own
+        import_module(engine).SessionStore.clear_expired()
+        self.stdout.write('Nothing to prune for %s sessions' % engine.rsplit('.', 1)[-1])
+
+    def prune_table(self, batch_size):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(Session.objects.filter(expire_date__lt=now)
+                        .values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
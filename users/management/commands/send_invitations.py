@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from users.onboarding import BATCH_SIZE, invite_cohort, pending_invitations
+
+
+class Command(BaseCommand):
+    help = 'Emails a password setup link to every voter who was not invited yet, in batches over one ' \
+           'mail connection, meant for cohorts of imported voters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--district', help='Only invite voters of this district')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Voters invited per batch')
+        parser.add_argument('--rate', type=float, help='Most emails sent per second, unlimited by default')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the voters to invite')
+
+    def handle(self, *args, **options):
+        users = pending_invitations(options['district'])
+        if options['dry_run']:
+            self.stdout.write('%d voters would be invited' % users.count())
+            return
+
+        def report(batch):
+            rate = batch.sent / batch.seconds if batch.seconds else 0
+            self.stdout.write('batch %d: %d sent, %d failed in %.2f s (%.1f emails/s)' %
+                              (batch.number, batch.sent, batch.failed, batch.seconds, rate))
+
+        reports = invite_cohort(users, batch_size=options['batch_size'], rate=options['rate'], report=report)
+        sent = sum(batch.sent for batch in reports)
+        failed = sum(batch.failed for batch in reports)
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style('Invited %d voters, %d failed and will be retried on the next run' % (sent, failed)))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import maintenance
+
+
+class Command(BaseCommand):
+    help = 'Purges, redistricts or deactivates voter accounts in bulk with chunked updates, ' \
+           'without the per account signals the admin runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['purge', 'redistrict', 'deactivate'])
+        parser.add_argument('--district', help='Voters of this district (case insensitive)')
+        parser.add_argument('--username', action='append', dest='usernames', help='Voter username, may be repeated')
+        parser.add_argument('--usernames-file', help='File with one voter username per line')
+        parser.add_argument('--to', help='New district of the redistricted voters')
+        parser.add_argument('--no-notify', action='store_false', dest='notify',
+                            help='Do not email purged voters about their deleted account')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the matching voters')
+
+    def handle(self, *args, **options):
+        usernames = options['usernames']
+        if options['usernames_file']:
+            with open(options['usernames_file']) as usernames_file:
+                usernames = (usernames or []) + [line.strip() for line in usernames_file if line.strip()]
+        if options['district'] is None and usernames is None:
+            raise CommandError('Select voters with --district, --username or --usernames-file')
+        if options['action'] == 'redistrict' and not options['to']:
+            raise CommandError('redistrict needs --to')
+
+        user_ids = maintenance.voters(district=options['district'], usernames=usernames)
+        if options['dry_run']:
+            self.stdout.write('%d voters would be %s' % (len(user_ids), {
+                'purge': 'purged', 'redistrict': 'redistricted', 'deactivate': 'deactivated'}[options['action']]))
+            return
+
+        if options['action'] == 'purge':
+            count = maintenance.purge(user_ids, notify=options['notify'])
+            self.stdout.write(self.style.SUCCESS('Purged %d voters' % count))
+        elif options['action'] == 'redistrict':
+            count = maintenance.redistrict(user_ids, options['to'])
+            self.stdout.write(self.style.SUCCESS('Moved %d voters to %s' % (count, options['to'])))
+        else:
+            count = maintenance.deactivate(user_ids)
+            self.stdout.write(self.style.SUCCESS('Deactivated %d voters' % count))
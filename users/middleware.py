@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from users.identity import get_identity
+
+
+class VoterIdentityMiddleware:
+    """
+    sets request.voter to the cached VoterIdentity of the signed in user, it evaluates false for anonymous users,
+    must come after AuthenticationMiddleware
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.voter = SimpleLazyObject(lambda: get_identity(request.user) if request.user.is_authenticated else None)
+        return self.get_response(request)
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:57
+
+from django.db import migrations
+import users.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_profile_ssn'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='ssn',
+            field=users.fields.EncryptedCharField(blank=True, max_length=20),
+        ),
+    ]
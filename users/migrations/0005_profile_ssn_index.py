@@ -0,0 +1,44 @@
+# Generated by Django 3.2.8 on 2026-10-19 17:58
+
+from django.db import migrations, models
+
+from users.fields import decrypt_values, ssn_index
+
+BATCH_SIZE = 1000
+
+
+def backfill_ssn_index(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    seen = set()
+    profiles = Profile.objects.filter(ssn__isnull=False).only('id', 'ssn').order_by('id')
+    for start in range(0, profiles.count(), BATCH_SIZE):
+        batch = list(profiles[start:start + BATCH_SIZE])
+        ssns = decrypt_values([profile.__dict__['ssn'] for profile in batch])
+        for profile, ssn in zip(batch, ssns):
+            profile.ssn_index = ssn_index(ssn)
+            # the index is unique, a repeated ssn stays unindexed on every profile after the first
+            if profile.ssn_index in seen:
+                profile.ssn_index = None
+            seen.add(profile.ssn_index)
+        Profile.objects.bulk_update(batch, ['ssn_index'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_profile_ssn_lazy_decrypt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='ssn_index',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_ssn_index, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='profile',
+            name='ssn_index',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
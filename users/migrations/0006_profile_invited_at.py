@@ -0,0 +1,29 @@
+# Generated by Django 3.2.8 on 2026-10-19 18:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_invited_at(apps, schema_editor):
+    # every existing voter with an email was invited when their account was created
+    Profile = apps.get_model('users', 'Profile')
+    User = apps.get_model('auth', 'User')
+    Profile.objects.exclude(user__email='')\
+        .update(invited_at=Subquery(User.objects.filter(pk=OuterRef('user_id')).values('date_joined')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_profile_ssn_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='invited_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_invited_at, migrations.RunPython.noop),
+    ]
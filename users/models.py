@@ -1,30 +1,54 @@
 import os
 
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.urls import reverse
-from django.conf import settings
-from django.contrib.auth.tokens import default_token_generator
 from django.utils.crypto import get_random_string
-from django.utils.http import urlsafe_base64_encode
 from django.core.mail import send_mail
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django_cryptography.fields import encrypt
+
+from users.fields import EncryptedCharField, Ciphertext, ssn_index
 
 
 def createSignature():
     return get_random_string(50)
 
+class ProfileQuerySet(models.QuerySet):
+    def by_ssn(self, ssn):
+        """
+        profiles with the given ssn, an indexed lookup of its blind index
+        """
+        return self.filter(ssn_index=ssn_index(ssn)) if ssn_index(ssn) else self.none()
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     district = models.CharField(max_length=50, blank=True)
-    ssn = encrypt(models.CharField(max_length=20, blank=True))
+    ssn = EncryptedCharField(max_length=20, blank=True)
+    # keyed hash of the ssn digits (users.fields.ssn_index) for exact lookups without decrypting
+    ssn_index = models.CharField(max_length=64, null=True, unique=True, editable=False)
     middle_name = models.CharField(max_length=30, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     sign = models.CharField(max_length=50, null=True, unique=True)
+    # when the voter was sent the link to set their password, see users.onboarding
+    invited_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ProfileQuerySet.as_manager()
+
+    def ssn_changed(self):
+        # an ssn loaded from the database and never read is still Ciphertext
+        return 'ssn' in self.__dict__ and not isinstance(self.__dict__['ssn'], Ciphertext)
+
+    def clean(self):
+        if self.ssn_changed() and Profile.objects.by_ssn(self.ssn).exclude(pk=self.pk).exists():
+            raise ValidationError({'ssn': 'Another voter already has this SSN.'})
 
     def save(self, *args, **kwargs):
+        if self.ssn_changed():
+            self.ssn_index = ssn_index(self.ssn)
+            if kwargs.get('update_fields') is not None and 'ssn' in kwargs['update_fields']:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'ssn_index'}
         if not self.sign:
             self.sign = createSignature()
             while Profile.objects.filter(sign=self.sign).exists():
@@ -43,27 +67,25 @@ def create_user_profile(sender, instance, created, **kwargs):
         except Profile.DoesNotExist:
             Profile.objects.create(user=instance)
 
-        token = default_token_generator.make_token(user=instance)
-        uid = urlsafe_base64_encode(str(instance.pk).encode())
-        reset_url = reverse('password_reset_confirm', kwargs={ 'token': token, 'uidb64': uid })
-        url = f'{settings.DEFAULT_DOMAIN}{reset_url}'
         if instance.email:
-            send_mail(
-                'Blind Voting App - Account Created',
-                f'An account for you has been created under the username "{instance.username}"!\nPlease set a password for your new account by visiting the following URL: {url}',
-                None,
-                [instance.email],
-                fail_silently=False
-            )
+            # imported at use, users.onboarding imports this module
+            from users.onboarding import send_invitation
+            send_invitation(instance)
+
+
+def account_deleted_message(username, email):
+    """
+    the (subject, message, from, recipients) tuple telling a voter their account was deleted
+    """
+    return (
+        'Blind Voting App - Account Deleted',
+        f'The account named "{username}" associated with this email has been deleted.',
+        None,
+        [email],
+    )
 
 
 @receiver(post_delete, sender=User)
 def delete_user_profile(sender, instance, **kwargs):
     if instance.email:
-        send_mail(
-            'Blind Voting App - Account Deleted',
-            f'The account named "{instance.username}" associated with this email has been deleted.',
-            None,
-            [instance.email],
-            fail_silently=False
-        )
\ No newline at end of file
+        send_mail(*account_deleted_message(instance.username, instance.email), fail_silently=False)
@@ -0,0 +1,125 @@
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage, get_connection
+from django.template import loader
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+
+from users.models import Profile
+
+# Invitations give a new voter a link to set the password of their account. The admin sends one
+# as it creates each account, imported cohorts are invited in batches by manage.py send_invitations.
+
+INVITATION_SUBJECT = 'Blind Voting App - Account Created'
+INVITATION_TEMPLATE = 'invitation_email.html'
+BATCH_SIZE = 100
+
+BatchReport = namedtuple('BatchReport', ['number', 'sent', 'failed', 'seconds'])
+
+
+class InvitationLinks:
+    """
+    builds password setup links, reversing the url once rather than once per voter
+    """
+    def __init__(self):
+        self.url = settings.DEFAULT_DOMAIN + reverse('password_reset_confirm',
+                                                     kwargs={'uidb64': 'UIDB64', 'token': 'TOKEN'})
+
+    def link(self, user):
+        uid = urlsafe_base64_encode(str(user.pk).encode())
+        return self.url.replace('UIDB64', uid).replace('TOKEN', default_token_generator.make_token(user))
+
+
+def invitation_messages(users, links=None, template=None):
+    links = links or InvitationLinks()
+    template = template or loader.get_template(INVITATION_TEMPLATE)
+    return [EmailMessage(INVITATION_SUBJECT,
+                         template.render({'username': user.username, 'url': links.link(user)}).strip(),
+                         None, [user.email])
+            for user in users]
+
+
+def send_invitation(user):
+    """
+    invites one new voter, used when an account is created through the admin
+    """
+    invitation_messages([user])[0].send(fail_silently=False)
+    Profile.objects.filter(user=user).update(invited_at=timezone.now())
+
+
+class RateLimitedMailer:
+    """
+    sends messages over one reused connection, at most rate messages per second when rate is given
+    """
+    def __init__(self, rate=None, connection=None):
+        self.rate = rate
+        self.connection = connection or get_connection()
+        self._next_send = None
+
+    def __enter__(self):
+        self.connection.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def wait(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self._next_send is not None and now < self._next_send:
+            time.sleep(self._next_send - now)
+            now = self._next_send
+        self._next_send = now + 1 / self.rate
+
+    def send(self, messages):
+        """
+        returns the messages that could not be sent, one failure does not stop the others
+        """
+        failed = []
+        for message in messages:
+            self.wait()
+            try:
+                self.connection.send_messages([message])
+            except Exception:
+                failed.append(message)
+        return failed
+
+
+def pending_invitations(district=None):
+    """
+    active voters with an email address who were never invited
+    """
+    users = User.objects.filter(is_active=True, profile__invited_at=None).exclude(email='')
+    if district is not None:
+        users = users.filter(profile__district__iexact=district)
+    return users.order_by('id')
+
+
+def invite_cohort(users, batch_size=BATCH_SIZE, rate=None, report=None, connection=None):
+    """
+    invites users batch_size at a time, marking the batch invited with one update,
+    calls report with a BatchReport after each batch and returns them all
+    """
+    links = InvitationLinks()
+    template = loader.get_template(INVITATION_TEMPLATE)
+    reports = []
+    user_ids = list(users.values_list('id', flat=True))
+    with RateLimitedMailer(rate, connection) as mailer:
+        for start in range(0, len(user_ids), batch_size):
+            started = time.perf_counter()
+            batch = list(User.objects.filter(id__in=user_ids[start:start + batch_size]).order_by('id'))
+            messages = invitation_messages(batch, links, template)
+            failed = mailer.send(messages)
+            invited = [user.pk for user, message in zip(batch, messages) if message not in failed]
+            Profile.objects.filter(user_id__in=invited).update(invited_at=timezone.now())
+            batch_report = BatchReport(len(reports) + 1, len(invited), len(failed), time.perf_counter() - started)
+            reports.append(batch_report)
+            if report:
+                report(batch_report)
+    return reports
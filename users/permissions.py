@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User, Group, Permission
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from users.identity import invalidate_users
+
+# Cached voter identities hold the user's resolved permissions, these receivers drop the identities
+# of every user affected by a group or permission change. Identities are only cached in a cache
+# shared by every worker (users.identity), so a revoked permission is gone for all of them at once.
+
+
+def _group_members(group_ids):
+    return User.objects.filter(groups__in=group_ids).values_list('id', flat=True).distinct()
+
+
+def _changed_ids(instance, action, reverse, pk_set, related_manager):
+    """
+    ids on the other side of an m2m change from instance, None when nothing changed
+    """
+    if action in ('post_add', 'post_remove'):
+        return [instance.pk] if not reverse else list(pk_set)
+    if action == 'pre_clear':
+        # the rows are gone by post_clear, read them while they still exist
+        return [instance.pk] if not reverse else list(getattr(instance, related_manager).values_list('id', flat=True))
+    return None
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    user_ids = _changed_ids(instance, action, reverse, pk_set, 'user_set')
+    if user_ids:
+        invalidate_users(user_ids)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    user_ids = _changed_ids(instance, action, reverse, pk_set, 'user_set')
+    if user_ids:
+        invalidate_users(user_ids)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    group_ids = _changed_ids(instance, action, reverse, pk_set, 'group_set')
+    if group_ids:
+        invalidate_users(list(_group_members(group_ids)))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_users(list(_group_members([instance.pk])))
+
+
+@receiver(pre_delete, sender=Permission)
+def permission_deleted(sender, instance, **kwargs):
+    user_ids = set(instance.user_set.values_list('id', flat=True))
+    user_ids.update(_group_members(instance.group_set.values_list('id', flat=True)))
+    invalidate_users(user_ids)
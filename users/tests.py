@@ -1,9 +1,30 @@
+import time
+from io import StringIO
+from unittest import mock
 from django.core import mail
-from django.test import TestCase
-from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User, Group, Permission
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.signing import Signer
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+from django_cryptography.fields import encrypt
+from django.db import DatabaseError, models
+from django.core.exceptions import ValidationError
+from users.fields import Ciphertext, InvalidToken, encrypt_values, decrypt_values, decrypt_instances, ssn_index
+from django.core.management.base import CommandError
+from ballots.counters import eligible_voters
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail.backends.locmem import EmailBackend
+from users import maintenance
+from users.checks import check_identity_cache
+from users.identity import get_identity, identity_cache_key, user_cache_key
+from users.onboarding import RateLimitedMailer, invite_cohort, pending_invitations
 from users.models import Profile
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Create your tests here.
 
@@ -148,7 +169,397 @@ class AccountTests(TestCase):
         reset_emails = [email for email in mail.outbox if email.subject == 'Blind Voting App - Account Created' and self.user.username in email.body]
         self.assertEqual(len(reset_emails), 1)
 
+    def test_new_user_marked_invited(self):
+        self.assertIsNotNone(Profile.objects.get(user=self.user).invited_at)
+        self.assertFalse(pending_invitations().exists())
+
     def test_user_delete_sends_email(self):
         self.user.delete()
         delete_emails = [email for email in mail.outbox if email.subject == 'Blind Voting App - Account Deleted' and self.user.username in email.body]
         self.assertEqual(len(delete_emails), 1)
+
+
+class PruneSessionsTests(TestCase):
+    def test_prune_expired_sessions(self):
+        now = timezone.now()
+        Session.objects.bulk_create([Session(session_key='expired%d' % i, session_data='',
+                                             expire_date=now - timedelta(days=1)) for i in range(5)])
+        Session.objects.create(session_key='current', session_data='', expire_date=now + timedelta(days=1))
+        out = StringIO()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            call_command('prune_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+
+
+# identities cached as with Redis, this test process is the only worker
+@override_settings(IDENTITY_CACHE='default')
+class VoterIdentityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', email='')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_identity_cached(self):
+        self.client.get(reverse('ballots:index'))
+        user = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(user.profile.district, "BaltimoreCounty")
+        self.assertNotIn('ssn', user.profile.__dict__)
+        identity = cache.get(identity_cache_key(self.user.pk))
+        self.assertEqual(identity.district_key, "baltimorecounty")
+        self.assertEqual(identity.signature, Signer().sign(self.user.profile.sign)[51:])
+        # no user or profile queries are left, only the session and the index page's own
+        with self.assertNumQueries(3):
+            self.client.get(reverse('ballots:index'))
+
+    def test_profile_save_invalidates(self):
+        self.client.get(reverse('ballots:index'))
+        profile = Profile.objects.get(user=self.user)
+        profile.district = "HowardCounty"
+        profile.save()
+        self.assertIsNone(cache.get(identity_cache_key(self.user.pk)))
+        response = self.client.get(reverse('ballots:index'))
+        self.assertEqual(response.wsgi_request.voter.district, "HowardCounty")
+
+
+# identities cached as with Redis, this test process is the only worker
+@override_settings(IDENTITY_CACHE='default')
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', email='')
+        self.group = Group.objects.create(name='Election staff')
+        self.permission = Permission.objects.get(codename='change_ballot')
+        self.group.permissions.add(self.permission)
+
+    def has_perm(self):
+        return get_identity(User.objects.get(pk=self.user.pk)).has_perm('ballots.change_ballot')
+
+    def test_group_changes_invalidate(self):
+        self.assertFalse(self.has_perm())
+        self.user.groups.add(self.group)
+        self.assertTrue(self.has_perm())
+        self.group.permissions.remove(self.permission)
+        self.assertFalse(self.has_perm())
+        self.permission.group_set.add(self.group)
+        self.assertTrue(self.has_perm())
+        self.group.user_set.clear()
+        self.assertFalse(self.has_perm())
+
+    def test_user_permission_changes_invalidate(self):
+        self.assertFalse(self.has_perm())
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.user.user_permissions.clear()
+        self.assertFalse(self.has_perm())
+
+    def test_admin_navigation_without_permission_queries(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        self.client.get(reverse('ballots:ballot-admin'))
+        # only the session and the ballot list itself are queried
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('ballots:ballot-admin'))
+        self.assertEqual(response.status_code, 200)
+
+
+class RequestScopedIdentityTests(TestCase):
+    """
+    without a shared cache users and identities are loaded by every request, changes made by
+    other processes, whose cache invalidation never reaches this one, apply immediately
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='testuser', email='')
+        self.user.profile.district = "BaltimoreCounty"
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.client.get(reverse('ballots:index'))
+
+    def test_nothing_cached(self):
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertIsNone(cache.get(identity_cache_key(self.user.pk)))
+
+    def test_deactivated_user_signed_out(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('ballots:index')).status_code, 302)
+
+    def test_redistricted_voter(self):
+        Profile.objects.filter(user=self.user).update(district="HowardCounty")
+        response = self.client.get(reverse('ballots:index'))
+        self.assertEqual(response.wsgi_request.voter.district, "HowardCounty")
+
+    def test_local_cache_rejected(self):
+        self.assertEqual(check_identity_cache(None), [])
+        with self.settings(IDENTITY_CACHE='default'):
+            self.assertEqual([error.id for error in check_identity_cache(None)], ['users.E001'])
+
+
+class RequestScopedPermissionTests(TestCase):
+    """
+    without a shared cache revoked permissions apply to the next request, whichever process revoked them
+    """
+    def setUp(self):
+        self.user = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(self.user)
+
+    def test_revoked_superuser(self):
+        self.assertEqual(self.client.get(reverse('ballots:ballot-admin')).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_superuser=False)
+        self.assertRedirects(self.client.get(reverse('ballots:ballot-admin')), reverse('ballots:index'),
+                             fetch_redirect_response=False)
+
+    def test_removed_group(self):
+        User.objects.filter(pk=self.user.pk).update(is_superuser=False)
+        group = Group.objects.create(name='Election staff')
+        group.permissions.add(Permission.objects.get(codename='change_ballot'))
+        self.user.groups.add(group)
+        self.assertTrue(get_identity(User.objects.get(pk=self.user.pk)).has_perm('ballots.change_ballot'))
+        User.groups.through.objects.filter(user=self.user).delete()
+        self.assertFalse(get_identity(User.objects.get(pk=self.user.pk)).has_perm('ballots.change_ballot'))
+
+    def test_permissions_read_when_checked(self):
+        User.objects.filter(pk=self.user.pk).update(is_superuser=False)
+        identity = get_identity(User.objects.get(pk=self.user.pk))
+        # voting pages never check permissions and do not query them
+        with self.assertNumQueries(0):
+            identity.signature, identity.district_key
+        with self.assertNumQueries(2):
+            self.assertFalse(identity.has_perm('ballots.change_ballot'))
+
+
+class EncryptedFieldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.ssn = '555-55-5555'
+        self.user.profile.save()
+
+    def test_decrypted_on_access(self):
+        profile = Profile.objects.get(user=self.user)
+        self.assertIsInstance(profile.__dict__['ssn'], Ciphertext)
+        self.assertEqual(profile.ssn, '555-55-5555')
+        self.assertEqual(profile.__dict__['ssn'], '555-55-5555')
+
+    def test_untouched_value_saved_unchanged(self):
+        stored = Profile.objects.values_list('ssn', flat=True).get(user=self.user)
+        profile = Profile.objects.get(user=self.user)
+        profile.district = 'HowardCounty'
+        profile.save()
+        self.assertEqual(Profile.objects.values_list('ssn', flat=True).get(user=self.user), stored)
+
+    def test_batch_decrypt(self):
+        other = User.objects.create(username='other')
+        other.profile.ssn = '111-11-1111'
+        other.profile.save()
+        profiles = decrypt_instances(list(Profile.objects.order_by('id')), 'ssn')
+        self.assertEqual([profile.__dict__['ssn'] for profile in profiles], ['555-55-5555', '111-11-1111'])
+        self.assertEqual(decrypt_values(encrypt_values(['a', '', None])), ['a', '', None])
+
+    def test_django_cryptography_format(self):
+        legacy = encrypt(models.CharField(max_length=20))
+        self.assertEqual(decrypt_values([legacy._dump('123-45-6789')]), ['123-45-6789'])
+        self.assertEqual(legacy._load(encrypt_values(['123-45-6789'])[0]), '123-45-6789')
+
+    def test_admin_user_list(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertContains(response, '555-55-5555')
+
+    def test_tampered_token(self):
+        token = encrypt_values(['555-55-5555'])[0]
+        with self.assertRaises(InvalidToken):
+            decrypt_values([token[:-1] + bytes([token[-1] ^ 1])])
+
+
+class SsnIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.user.profile.ssn = '555-55-5555'
+        self.user.profile.save()
+
+    def test_lookup_ignores_formatting(self):
+        self.assertEqual(self.user.profile.ssn_index, ssn_index('555555555'))
+        self.assertEqual(list(Profile.objects.by_ssn('555 55 5555')), [self.user.profile])
+        self.assertFalse(Profile.objects.by_ssn('111-11-1111').exists())
+        self.assertFalse(Profile.objects.by_ssn('').exists())
+
+    def test_index_follows_changes(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.district = 'HowardCounty'
+        profile.save()
+        self.assertTrue(Profile.objects.by_ssn('555-55-5555').exists())
+        profile.ssn = '111-11-1111'
+        profile.save(update_fields=['ssn'])
+        self.assertEqual(list(Profile.objects.by_ssn('111-11-1111')), [profile])
+        profile.ssn = ''
+        profile.save()
+        self.assertIsNone(Profile.objects.get(pk=profile.pk).ssn_index)
+
+    def test_duplicate_rejected(self):
+        other = User.objects.create(username='other')
+        other.profile.ssn = '555555555'
+        with self.assertRaises(ValidationError):
+            other.profile.full_clean()
+        self.user.profile.full_clean()
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:auth_user_changelist'), {'q': '555-55-5555'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.user])
+
+
+# identities cached as with Redis, this test process is the only worker
+@override_settings(IDENTITY_CACHE='default')
+class VoterMaintenanceTests(TestCase):
+    def setUp(self):
+        self.voters = []
+        for number, district in enumerate(['BaltimoreCounty', 'baltimorecounty', 'BaltimoreCounty', 'HowardCounty']):
+            user = User.objects.create(username='voter%d' % number, email='voter%d@fakemail.com' % number)
+            user.profile.district = district
+            user.profile.save()
+            self.voters.append(user)
+        self.admin = User.objects.create_superuser('testadmin', 'a@a.com', 'pass123')
+        self.admin.profile.district = 'BaltimoreCounty'
+        self.admin.profile.save()
+        for user in self.voters:
+            get_identity(user)
+        mail.outbox = []
+
+    def test_purge(self):
+        out = StringIO()
+        call_command('voters', 'purge', district='BALTIMORECOUNTY', stdout=out)
+        self.assertIn('Purged 3 voters', out.getvalue())
+        self.assertEqual(list(User.objects.order_by('id').values_list('username', flat=True)), ['voter3', 'testadmin'])
+        self.assertEqual(Profile.objects.count(), 2)
+        self.assertEqual(eligible_voters('BaltimoreCounty'), 1)
+        self.assertEqual(eligible_voters('HowardCounty'), 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].subject, 'Blind Voting App - Account Deleted')
+        self.assertIsNone(cache.get(identity_cache_key(self.voters[0].pk)))
+        self.assertIsNotNone(cache.get(identity_cache_key(self.voters[3].pk)))
+
+    def test_purge_chunk_failure(self):
+        delete_users = maintenance._delete_users
+        deleted_chunks = []
+
+        def fail_second_chunk(chunk):
+            if deleted_chunks:
+                raise DatabaseError('chunk failed')
+            delete_users(chunk)
+            deleted_chunks.append(chunk)
+
+        with mock.patch('users.maintenance.chunks', lambda ids: (ids[start:start + 2] for start in range(0, len(ids), 2))), \
+                mock.patch('users.maintenance._delete_users', fail_second_chunk):
+            with self.assertRaises(DatabaseError):
+                call_command('voters', 'purge', district='BaltimoreCounty', stdout=StringIO())
+        self.assertEqual(list(User.objects.order_by('id').values_list('username', flat=True)),
+                         ['voter2', 'voter3', 'testadmin'])
+        # the voters of the committed chunk are told, the others still have their account
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['voter0@fakemail.com', 'voter1@fakemail.com'])
+        self.assertEqual(eligible_voters('BaltimoreCounty'), 2)
+
+    def test_purge_without_notifications(self):
+        call_command('voters', 'purge', usernames=['voter0', 'testadmin'], notify=False, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='voter0').exists())
+        self.assertTrue(User.objects.filter(username='testadmin').exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_redistrict(self):
+        call_command('voters', 'redistrict', district='BaltimoreCounty', to='HowardCounty', stdout=StringIO())
+        self.assertEqual(eligible_voters('BaltimoreCounty'), 1)
+        self.assertEqual(eligible_voters('HowardCounty'), 4)
+        self.assertEqual(Profile.objects.get(user=self.voters[1]).district, 'HowardCounty')
+        self.assertIsNone(cache.get(identity_cache_key(self.voters[1].pk)))
+
+    def test_deactivate(self):
+        self.client.force_login(self.voters[0])
+        call_command('voters', 'deactivate', usernames=['voter0'], stdout=StringIO())
+        self.assertFalse(User.objects.get(username='voter0').is_active)
+        self.assertIsNone(cache.get(user_cache_key(self.voters[0].pk)))
+        response = self.client.get(reverse('ballots:index'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_dry_run_and_selection(self):
+        out = StringIO()
+        call_command('voters', 'purge', district='BaltimoreCounty', dry_run=True, stdout=out)
+        self.assertIn('3 voters would be purged', out.getvalue())
+        self.assertEqual(User.objects.count(), 5)
+        with self.assertRaises(CommandError):
+            call_command('voters', 'purge')
+        with self.assertRaises(CommandError):
+            call_command('voters', 'redistrict', district='BaltimoreCounty')
+
+
+class VoterMaintenanceAcrossProcessesTests(TestCase):
+    """
+    the command runs in its own process, the site's workers see its changes on their next request
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='voter0', email='')
+        self.user.profile.district = 'BaltimoreCounty'
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.client.get(reverse('ballots:index'))
+        # whatever the command invalidates only reaches its own process
+        patcher = mock.patch('users.maintenance.invalidate_users')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_deactivate(self):
+        call_command('voters', 'deactivate', usernames=['voter0'], stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('ballots:index')).status_code, 302)
+
+    def test_redistrict(self):
+        call_command('voters', 'redistrict', usernames=['voter0'], to='HowardCounty', stdout=StringIO())
+        response = self.client.get(reverse('ballots:index'))
+        self.assertEqual(response.wsgi_request.voter.district, 'HowardCounty')
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        if any(message.to == ['voter1@fakemail.com'] for message in messages):
+            raise ConnectionError('refused')
+        return super().send_messages(messages)
+
+
+class OnboardingTests(TestCase):
+    def setUp(self):
+        # an imported cohort, bulk inserts send no signals and so no invitations
+        User.objects.bulk_create([User(username='voter%d' % number, email='voter%d@fakemail.com' % number)
+                                  for number in range(5)])
+        Profile.objects.bulk_create([Profile(user=user, district='BaltimoreCounty', sign='sign%d' % user.pk)
+                                     for user in User.objects.all()])
+
+    def test_send_invitations(self):
+        out = StringIO()
+        call_command('send_invitations', batch_size=2, stdout=out)
+        self.assertIn('batch 3: 1 sent, 0 failed', out.getvalue())
+        self.assertIn('Invited 5 voters', out.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        user = User.objects.get(username='voter0')
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, 'Blind Voting App - Account Created')
+        self.assertIn('"voter0"', message.body)
+        uid, token = message.body.rstrip('/').split('/')[-2:]
+        self.assertEqual(uid, urlsafe_base64_encode(str(user.pk).encode()))
+        self.assertTrue(default_token_generator.check_token(user, token))
+        self.assertFalse(Profile.objects.filter(invited_at=None).exists())
+
+        # everyone is invited once
+        call_command('send_invitations', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failures_retried(self):
+        reports = invite_cohort(pending_invitations(), batch_size=10, connection=FailingBackend())
+        self.assertEqual([(report.sent, report.failed) for report in reports], [(4, 1)])
+        self.assertEqual(list(pending_invitations().values_list('username', flat=True)), ['voter1'])
+
+    def test_rate_limit(self):
+        started = time.monotonic()
+        with RateLimitedMailer(rate=100) as mailer:
+            mailer.send([mail.EmailMessage('subject', 'body', None, ['a@a.com']) for number in range(4)])
+        self.assertGreaterEqual(time.monotonic() - started, 0.03)
+        self.assertEqual(len(mail.outbox), 4)